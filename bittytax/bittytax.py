@@ -8,6 +8,7 @@ import sys
 import codecs
 import platform
 import re
+import multiprocessing
 
 import colorama
 from colorama import Fore, Back
@@ -24,7 +25,10 @@ from .audit import AuditRecords
 from .price.valueasset import ValueAsset
 from .price.exceptions import DataSourceError
 from .tax import TaxCalculator, CalculateCapitalGains as CCG
-from .report import ReportLog, ReportPdf
+from .taxcalendar import get_tax_calendar
+from .snapshot import TaxSnapshots
+from .scenarios import TaxScenario, TaxScenarios
+from .report import ReportLog, ReportPdf, ReportScenarios
 from .exceptions import ImportFailureError
 
 if sys.stdout.encoding != 'UTF-8':
@@ -97,6 +101,31 @@ def main():
     parser.add_argument('--business',
                         action='store_true',
                         help="activate bed and breakfast rules for businesses and also sets bnb duration to 10 (unless overriden by --bnb)")
+    parser.add_argument('--snapshot',
+                        dest='snapshot_filename',
+                        type=str,
+                        help="load/save section 104 snapshots at the start of each tax year "
+                             "from/to the file specified, only tax years affected by changed "
+                             "transactions (or config) are recalculated")
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help="number of processes used to calculate capital gains, assets are "
+                             "processed in parallel (0 uses all CPUs)")
+    parser.add_argument('--scenario',
+                        dest='scenarios',
+                        type=validate_scenario,
+                        action='append',
+                        default=[],
+                        help="compare the tax calculated using the config with a scenario, "
+                             "syntax NAME:KEY=VALUE[,...] where KEY is trade_asset_type, "
+                             "trade_allowable_cost_type, bnb, business or time (the price "
+                             "used for each day), can be given more than once")
+    parser.add_argument('--plan',
+                        action='store_true',
+                        help="show the historic prices needed from each data source, which are "
+                             "already cached and how many requests will be made, then exit")
     parser.add_argument('--export',
                         action='store_true',
                         help="export your transaction records populated with price data")
@@ -140,12 +169,32 @@ def main():
     if not config.args.allowgiftdupes:
         transaction_records = remove_gift_dupes(transaction_records)
 
+    if config.args.plan:
+        try:
+            do_plan(transaction_records)
+        except DataSourceError as e:
+            parser.exit("%sERROR%s %s" % (
+                Back.RED+Fore.BLACK, Back.RESET+Fore.RED, e))
+        parser.exit()
+
     if config.args.export:
         do_export(transaction_records)
         parser.exit()
 
     audit = AuditRecords(transaction_records)
 
+    if config.args.scenarios:
+        if len(set(scenario.name for scenario in config.args.scenarios)) != \
+                len(config.args.scenarios):
+            parser.error("argument --scenario: scenario names must be unique")
+
+        try:
+            do_scenarios(transaction_records)
+        except DataSourceError as e:
+            parser.exit("%sERROR%s %s" % (
+                Back.RED+Fore.BLACK, Back.RESET+Fore.RED, e))
+        parser.exit()
+
     try:
         tax, value_asset = do_tax(transaction_records)
         if not config.args.skip_integrity:
@@ -161,6 +210,10 @@ def main():
                          config.args.summary,
                          value_asset)
 
+        if config.args.debug:
+            print("%sprice: resolver %s" % (Fore.YELLOW, value_asset.resolver))
+            value_asset.price_data.output_stats()
+
     except DataSourceError as e:
         parser.exit("%sERROR%s %s" % (
             Back.RED+Fore.BLACK, Back.RESET+Fore.RED, e))
@@ -246,15 +299,49 @@ def validate_field_filter(value):
 
 def validate_year(value):
     year = int(value)
-    if year not in CCG.CG_DATA_INDIVIDUALS:
+    # Tax years before the first tax year are included within it, so cannot be reported alone
+    first_year = max(min(CCG.CG_DATA_INDIVIDUALS), get_tax_calendar().first_year)
+    if year not in CCG.CG_DATA_INDIVIDUALS or year < first_year:
         raise argparse.ArgumentTypeError("tax year %d is not supported, "
                                          "must be in the range (%s-%s)" % (
             year,
-            min(CCG.CG_DATA_INDIVIDUALS),
+            first_year,
             max(CCG.CG_DATA_INDIVIDUALS)))
 
     return year
 
+def validate_scenario(value):
+    try:
+        name, settings = value.split(':', 1)
+        scenario = {}
+        for setting in settings.split(','):
+            key, setting_value = setting.split('=', 1)
+            key = key.strip().lower()
+            if key not in TaxScenario.KEYS:
+                raise argparse.ArgumentTypeError("scenario key %s is not supported, must be "
+                                                 "one of (%s)" % (
+                                                     key, ', '.join(sorted(TaxScenario.KEYS))))
+
+            if key == 'time':
+                setting_value = setting_value.strip().lower()
+                if setting_value not in config.DATA_SOURCE_TIMES:
+                    raise ValueError
+            else:
+                setting_value = int(setting_value)
+                if key in ('trade_asset_type', 'trade_allowable_cost_type') and \
+                        setting_value not in (0, 1, 2) or key == 'bnb' and setting_value < 1:
+                    raise ValueError
+
+            scenario[TaxScenario.KEYS[key]] = bool(setting_value) if key == 'business' \
+                                              else setting_value
+    except ValueError:
+        raise argparse.ArgumentTypeError("malformed NAME:KEY=VALUE[,...] string: %s" % value)
+
+    if not name or name == 'config':
+        raise argparse.ArgumentTypeError("scenario name is not valid: %s" % value)
+
+    return TaxScenario(name, scenario)
+
 def validate_start_of_year(value):
     day, month = map(int, value.split('-', 2))
     month_days = [0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]  # 29 Feb will never be a tax year start date
@@ -314,14 +401,59 @@ def do_import(filenames, parser):
 
 def do_tax(transaction_records):
     value_asset = ValueAsset()
+    do_prefetch(transaction_records, value_asset)
     transaction_history = TransactionHistory(transaction_records, value_asset)
+    return do_capital_gains(transaction_history.transactions), value_asset
 
-    tax = TaxCalculator(transaction_history.transactions)
-    tax.pool_same_day()
-    tax.match(tax.DISPOSAL_SAME_DAY)
-    tax.match(tax.DISPOSAL_BED_AND_BREAKFAST)
-    tax.process_section104()
-    return tax, value_asset
+def do_capital_gains(transactions):
+    if config.args.snapshot_filename:
+        tax = TaxCalculator(transactions, TaxSnapshots(config.args.snapshot_filename, transactions))
+        tax.restore_snapshot()
+    else:
+        tax = TaxCalculator(transactions)
+
+    jobs = get_jobs()
+    if jobs > 1 and not config.args.debug:
+        tax.process_parallel(jobs)
+    else:
+        # Debug logging is kept in order
+        tax.pool_same_day()
+        tax.match(tax.DISPOSAL_SAME_DAY)
+        tax.match(tax.DISPOSAL_BED_AND_BREAKFAST)
+        tax.process_section104()
+
+    if tax.snapshots:
+        tax.snapshots.dump_snapshots(tax.tax_events)
+    return tax
+
+def do_prefetch(transaction_records, value_asset):
+    if config.args.nocache:
+        # Every price is requested again when it is looked up, so prefetching would double
+        #  the requests
+        return
+
+    value_asset.get_price_plan(
+        TransactionHistory.get_required_values(transaction_records)).prefetch()
+
+def do_plan(transaction_records):
+    value_asset = ValueAsset()
+    value_asset.get_price_plan(
+        TransactionHistory.get_required_values(transaction_records)).output()
+
+def get_jobs():
+    jobs = config.args.jobs or multiprocessing.cpu_count()
+    if jobs > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        print("%sWARNING%s Parallel processing is not supported on this platform" % (
+            Back.YELLOW+Fore.BLACK, Back.RESET+Fore.YELLOW))
+        jobs = 1
+    return jobs
+
+def do_scenarios(transaction_records):
+    value_asset = ValueAsset()
+    do_prefetch(transaction_records, value_asset)
+    scenarios = TaxScenarios(config.args.scenarios, transaction_records, value_asset)
+    scenarios.calculate(get_jobs())
+    ReportScenarios(scenarios)
 
 def do_integrity_check(audit, holdings):
     int_passed = True
@@ -359,16 +491,16 @@ def transfer_mismatches(holdings):
 
 def do_each_tax_year(tax, tax_year, summary, value_asset):
     if tax_year:
-        print("%scalculating tax year %d/%d" % (
-            Fore.CYAN, tax_year - 1, tax_year))
+        print("%scalculating tax year %s" % (
+            Fore.CYAN, tax.calendar.label(tax_year)))
         tax.calculate_capital_gains(tax_year)
         if not summary:
             tax.calculate_income(tax_year)
     else:
         # Calculate for all years
-        for year in sorted(tax.tax_events):
-            print("%scalculating tax year %d/%d" % (
-                Fore.CYAN, year - 1, year))
+        for year in tax.tax_years():
+            print("%scalculating tax year %s" % (
+                Fore.CYAN, tax.calendar.label(year)))
             if year in CCG.CG_DATA_INDIVIDUALS:
                 tax.calculate_capital_gains(year)
                 if not summary:
@@ -384,6 +516,7 @@ def do_each_tax_year(tax, tax_year, summary, value_asset):
 
 def do_export(transaction_records):
     value_asset = ValueAsset()
+    do_prefetch(transaction_records, value_asset)
     TransactionHistory(transaction_records, value_asset)
     ExportRecords(transaction_records).write_csv()
 
@@ -50,7 +50,8 @@ class Config(object):
 
     DATA_SOURCE_FIAT = ['Frankfurter']
     DATA_SOURCE_CRYPTO = ['CryptoCompare', 'CoinGecko']
-    DATA_SOURCE_TIME = 'close'  # open,high,low,close; TODO: avg
+    DATA_SOURCE_TIME = 'close'
+    DATA_SOURCE_TIMES = ('open', 'high', 'low', 'close', 'avg')
 
     DEFAULT_CONFIG = {
         'fiat_list': FIAT_LIST,
@@ -64,6 +65,7 @@ class Config(object):
         'data_source_fiat': DATA_SOURCE_FIAT,
         'data_source_crypto': DATA_SOURCE_CRYPTO,
         'data_source_time': DATA_SOURCE_TIME,
+        'data_source_options': {},
         'tax_year_start_day': TAX_YEAR_START_DAY,
         'tax_year_start_month': TAX_YEAR_START_MONTH,
         'tax_year_first_year': None,
@@ -9,6 +9,8 @@ from tqdm import tqdm
 from .config import config
 
 class Holdings(object):
+    __slots__ = ('asset', 'quantity', 'cost', 'fees', 'withdrawals', 'deposits', 'mismatches')
+
     def __init__(self, asset):
         self.asset = asset
         self.quantity = Decimal(0)
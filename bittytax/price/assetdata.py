@@ -2,17 +2,15 @@
 # (c) Nano Nano Ltd 2020
 
 from ..config import config
-from .datasource import DataSourceBase, ExchangeRatesAPI, RatesAPI, Frankfurter
+from .datasource import DataSourceBase, DataSources, ExchangeRatesAPI, RatesAPI, Frankfurter
 from .exceptions import UnexpectedDataSourceError
 
 class AssetData(object):
     FIAT_DATASOURCES = (ExchangeRatesAPI.__name__, RatesAPI.__name__, Frankfurter.__name__)
 
     def __init__(self):
-        self.data_sources = {}
-
-        for data_source_class in DataSourceBase.__subclasses__():
-            self.data_sources[data_source_class.__name__.upper()] = data_source_class()
+        self.data_sources = DataSources([data_source_class.__name__.upper()
+                                         for data_source_class in DataSourceBase.__subclasses__()])
 
     def get_assets(self, req_symbol, req_data_source, search):
         if not req_data_source or req_data_source == 'ALL':
@@ -53,14 +51,19 @@ class AssetData(object):
             ds_priority = config.data_source_crypto
 
         for ds in ds_priority:
-            if ds.upper() in self.data_sources:
-                if symbol in self.data_sources[ds.upper()].assets:
-                    if ds.upper() == data_source.upper() and \
-                            self.data_sources[ds.upper()].assets[symbol].get('id') == asset_id:
-                        return True
-                    return False
-            else:
+            if ds.upper() not in self.data_sources:
                 raise UnexpectedDataSourceError(ds, DataSourceBase)
+
+        # Can't be the priority if it's not in the list, so no other data sources are needed
+        if data_source.upper() not in [ds.upper() for ds in ds_priority]:
+            return False
+
+        for ds in ds_priority:
+            if symbol in self.data_sources[ds.upper()].assets:
+                if ds.upper() == data_source.upper() and \
+                        self.data_sources[ds.upper()].assets[symbol].get('id') == asset_id:
+                    return True
+                return False
         return False
 
     @staticmethod
@@ -123,17 +126,17 @@ class AssetData(object):
 
                 if not config.args.nocache:
                     # check cache first
-                    if pair in self.data_sources[ds].prices and \
-                            date in self.data_sources[ds].prices[pair]:
-                        asset_id['price'] = self.data_sources[ds].prices[pair][date]['price']
+                    cached = self.data_sources[ds].prices.lookup(pair, date)
+                    if cached is not None:
+                        asset_id['price'] = cached['price']
                         all_assets.append(asset_id)
                         continue
 
                 self.data_sources[ds].get_historical(req_symbol, asset_id['quote'],
                                                      req_date, asset_id['id'])
-                if pair in self.data_sources[ds].prices and \
-                       date in self.data_sources[ds].prices[pair]:
-                    asset_id['price'] = self.data_sources[ds].prices[pair][date]['price']
+                cached = self.data_sources[ds].prices.lookup(pair, date)
+                if cached is not None:
+                    asset_id['price'] = cached['price']
 
                 all_assets.append(asset_id)
         return all_assets
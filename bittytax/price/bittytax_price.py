@@ -6,7 +6,9 @@ import sys
 import codecs
 import platform
 import re
+import csv
 from decimal import Decimal, InvalidOperation
+from datetime import datetime, timedelta
 
 import colorama
 from colorama import Fore, Back
@@ -17,11 +19,13 @@ from ..config import config
 from .datasource import DataSourceBase
 from .assetdata import AssetData
 from .valueasset import ValueAsset
-from .exceptions import DataSourceError
+from .priceplan import PricePlan
+from .exceptions import DataSourceError, DataSourceRequestError
 
 CMD_LATEST = 'latest'
 CMD_HISTORY = 'historic'
 CMD_LIST = 'list'
+CMD_BATCH = 'batch'
 
 if sys.stdout.encoding != 'UTF-8':
     if sys.version_info[:2] >= (3, 7):
@@ -140,6 +144,44 @@ def main():
                              action='store_true',
                              help="enable debug logging")
 
+    parser_batch = subparsers.add_parser(CMD_BATCH,
+                                         help="get the prices of many assets and dates",
+                                         description="Get the historic prices for each row "
+                                                     "(asset, date[, quantity[, targetasset]]) "
+                                                     "of a CSV [filename], or for an asset over "
+                                                     "a range of dates [-r]. All the prices are "
+                                                     "requested together, and written as CSV "
+                                                     "to standard output, or to a file [-o].")
+    parser_batch.add_argument('filename',
+                              type=argparse.FileType('r'),
+                              nargs='?',
+                              help="CSV file of rows to price, or - to read from standard input")
+    parser_batch.add_argument('-r',
+                              '--range',
+                              type=str,
+                              nargs=3,
+                              metavar=('ASSET', 'START', 'END'),
+                              dest='range',
+                              help="price ASSET for each date from START to END")
+    parser_batch.add_argument('-o',
+                              type=argparse.FileType('w'),
+                              default='-',
+                              dest='output_filename',
+                              help="write the prices to a CSV file, instead of standard output")
+    parser_batch.add_argument('-t',
+                              type=str.upper,
+                              default=config.CCY,
+                              dest='targetasset',
+                              help="convert into specificed target asset, unless given in the "
+                                   "row (default=%s)" % config.CCY)
+    parser_batch.add_argument('-nc',
+                              '--nocache',
+                              action='store_true', help="bypass data cache")
+    parser_batch.add_argument('-d',
+                              '--debug',
+                              action='store_true',
+                              help="enable debug logging")
+
     config.args = parser.parse_args()
 
     if config.args.debug:
@@ -233,6 +275,22 @@ def main():
             parser.exit("No results found")
 
         output_assets(assets)
+    elif config.args.command == CMD_BATCH:
+        if bool(config.args.filename) == bool(config.args.range):
+            parser_batch.error("either a filename or a range [-r] is required")
+
+        try:
+            if config.args.filename:
+                rows = get_batch_rows(config.args.filename, config.args.targetasset)
+            else:
+                rows = get_range_rows(*config.args.range, target_symbol=config.args.targetasset)
+        except argparse.ArgumentTypeError as e:
+            parser_batch.error(str(e))
+
+        try:
+            output_batch(rows, config.args.output_filename)
+        except DataSourceError as e:
+            parser.exit("%sERROR%s %s" % (Back.RED+Fore.BLACK, Back.RESET+Fore.RED, e))
 
 def get_latest_btc_price():
     btc = {}
@@ -283,6 +341,98 @@ def output_ds_price(asset):
         asset['name'],
         Fore.YELLOW + ' <-' if asset.get('priority') else ''))
 
+def output_batch(rows, output):
+    value_asset = ValueAsset()
+    today = datetime.now().date()
+
+    # All the prices needed are requested together, then each row is priced from the cache
+    plan = PricePlan(value_asset.price_data)
+    latest = {}
+    for symbol, timestamp, _, target_symbol in rows:
+        if symbol == target_symbol:
+            continue
+
+        if timestamp.date() >= today:
+            latest.setdefault(target_symbol, set()).add(symbol)
+        else:
+            plan.add(symbol, target_symbol, timestamp)
+
+    plan.plan()
+    plan.prefetch()
+    for target_symbol, symbols in sorted(latest.items()):
+        value_asset.prefetch_latest(symbols, target_symbol)
+
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(['Asset', 'Date', 'Quantity', 'Target Asset', 'Price', 'Value',
+                     'Data Source'])
+    for symbol, timestamp, quantity, target_symbol in rows:
+        try:
+            if symbol == target_symbol:
+                price, data_source = Decimal(1), None
+            elif timestamp.date() >= today:
+                price, _, data_source = value_asset.get_latest_price(symbol, target_symbol)
+            else:
+                price, _, data_source = value_asset.get_historical_price(symbol, timestamp,
+                                                                         target_symbol)
+        except DataSourceRequestError as e:
+            # Every data source failed, the row is left without a price, and the rest are
+            #  still priced
+            print("%sWARNING%s %s, price for %s on %s is not available" % (
+                Back.YELLOW+Fore.BLACK, Back.RESET+Fore.YELLOW,
+                e, symbol, timestamp.strftime('%Y-%m-%d')))
+            price, data_source = None, None
+
+        writer.writerow([symbol,
+                         timestamp.strftime('%Y-%m-%d'),
+                         '{0:f}'.format(quantity.normalize()) if quantity is not None else '',
+                         target_symbol,
+                         '{0:f}'.format(price.normalize()) if price is not None else '',
+                         '{0:f}'.format((price * quantity).normalize())
+                         if price is not None and quantity is not None else '',
+                         data_source or ''])
+
+    if config.args.debug:
+        value_asset.price_data.output_stats()
+
+def get_batch_rows(csv_file, target_symbol):
+    rows = []
+    for row_num, row in enumerate(csv.reader(csv_file), 1):
+        if not row or not ''.join(row).strip():
+            continue
+
+        if row_num == 1 and row[0].strip().lower() == 'asset':
+            # Header row
+            continue
+
+        if len(row) < 2 or len(row) > 4:
+            raise argparse.ArgumentTypeError("row %d: expected asset, date[, quantity[, "
+                                             "targetasset]]" % row_num)
+        try:
+            timestamp = validate_date(row[1].strip())
+        except argparse.ArgumentTypeError as e:
+            raise argparse.ArgumentTypeError("row %d: %s" % (row_num, e))
+
+        try:
+            quantity = validate_quantity(row[2].strip()) \
+                    if len(row) > 2 and row[2].strip() else None
+        except argparse.ArgumentTypeError as e:
+            raise argparse.ArgumentTypeError("row %d: %s" % (row_num, e))
+
+        rows.append((row[0].strip().upper(),
+                     timestamp,
+                     quantity,
+                     row[3].strip().upper() if len(row) > 3 and row[3].strip() else target_symbol))
+    return rows
+
+def get_range_rows(symbol, start, end, target_symbol):
+    start = validate_date(start)
+    end = validate_date(end)
+    if end < start:
+        raise argparse.ArgumentTypeError("end date is before start date")
+
+    return [(symbol.upper(), start + timedelta(days=i), None, target_symbol)
+            for i in range((end - start).days + 1)]
+
 def output_assets(assets):
     for asset in assets:
         print("%s%s (%s) %svia %s%s%s" % (
@@ -1,97 +1,268 @@
 # -*- coding: utf-8 -*-
 # (c) Nano Nano Ltd 2019
 
-import os
-import atexit
-import json
+import time
+import random
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
 from decimal import Decimal
 from datetime import datetime, timedelta
 
 from colorama import Fore, Back
-import dateutil.parser
 import requests
 
 from ..version import __version__
 from ..config import config
-from .exceptions import UnexpectedDataSourceAssetIdError
+from .exceptions import UnexpectedDataSourceAssetIdError, DataSourceRequestError, \
+                        DataSourceUnavailableError
+from .fetcher import RateLimiter, CircuitBreaker
+from .pricecache import PriceCache, PriceSeries, CoinListCache, PRICE, OHLC
 
 CRYPTOCOMPARE_MAX_DAYS = 2000
+CRYPTOCOMPARE_MAX_FSYMS = 300
 COINPAPRIKA_MAX_DAYS = 5000
+COINGECKO_MAX_IDS = 2000
+# Start of the coverage for a data source which returns all of its history
+HISTORY_START = '0001-01-01'
+EPOCH_DAY = datetime(1970, 1, 1).toordinal()
 
 class DataSourceBase(object):
     USER_AGENT = 'BittyTax/v%s' % __version__
     TIME_OUT = 20
+    CONNECT_TIME_OUT = 10
+    # Default request limits, can be changed for each data source by the config
+    MAX_WORKERS = 2
+    REQUESTS_PER_SECOND = 5
+    RETRIES = 5
+    RETRY_AFTER = 10
+    BACKOFF = 1
+    BACKOFF_MAX = 30
+    COIN_LIST_TTL = 24
+    NEGATIVE_TTL = 24 * 7
+    BREAKER_FAILURES = 5
+    BREAKER_COOL_DOWN = 300
+    # Hedging is off unless a percentile is given, it needs some latencies to be useful
+    HEDGE_PERCENTILE = None
+    HEDGE_MIN_SAMPLES = 10
+    LATENCY_SAMPLES = 100
+    # Prices kept for each day
+    FIELDS = PRICE
 
     def __init__(self):
+        options = config.data_source_options.get(self.name(), {})
+
         self.assets = {}
         self.ids = {}
-        self.prices = self.load_prices()
-
-        for pair in sorted(self.prices):
-            if config.args.debug:
-                print("%sprice: %s (%s) data cache loaded" % (Fore.YELLOW, self.name(), pair))
-
-        atexit.register(self.dump_prices)
+        self.prices = PriceCache(self.name(),
+                                 options.get('negative_ttl', self.NEGATIVE_TTL) * 60 * 60,
+                                 self.FIELDS)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.hedged = 0
+        self.hedges_won = 0
+        self.latencies = deque(maxlen=self.LATENCY_SAMPLES)
+
+        self.max_workers = options.get('max_workers', self.MAX_WORKERS)
+        self.limiter = RateLimiter(self.max_workers,
+                                   options.get('requests_per_second', self.REQUESTS_PER_SECOND))
+        self.retries = options.get('retries', self.RETRIES)
+        self.timeout = (options.get('connect_timeout', self.CONNECT_TIME_OUT),
+                        options.get('read_timeout', self.TIME_OUT))
+        self.coin_list_ttl = options.get('coin_list_ttl', self.COIN_LIST_TTL) * 60 * 60
+        self.breaker = CircuitBreaker(options.get('breaker_failures', self.BREAKER_FAILURES),
+                                      options.get('breaker_cool_down', self.BREAKER_COOL_DOWN))
+        self.hedge_percentile = options.get('hedge_percentile', self.HEDGE_PERCENTILE)
+        # Requests can be sent to another server (i.e. a proxy, mirror or local stand-in)
+        self.base_url = options.get('base_url', self.BASE_URL).rstrip('/')
+
+        # Connections are kept alive between requests
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': self.USER_AGENT})
+        for prefix in ('https://', 'http://'):
+            self.session.mount(prefix, requests.adapters.HTTPAdapter(
+                pool_maxsize=self.max_workers))
 
     def name(self):
         return self.__class__.__name__
 
     def get_json(self, url):
+        response = self.get_response(url)
+        if response:
+            return response.json()
+        return {}
+
+    def get_response(self, url, headers=None):
         if config.args.debug:
             print("%sprice: GET %s" % (Fore.YELLOW, url))
 
-        response = requests.get(url, headers={'User-Agent': self.USER_AGENT}, timeout=self.TIME_OUT)
+        for retry in range(self.retries + 1):
+            if not self.breaker.allow():
+                raise DataSourceUnavailableError(self.name(), self.breaker.remaining())
+
+            response = None
+            try:
+                with self.limiter:
+                    with self.lock:
+                        self.requests += 1
+                    start_time = time.monotonic()
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            else:
+                if response.status_code not in [429, 500, 502, 503, 504]:
+                    self.breaker.success()
+                    self.latencies.append(time.monotonic() - start_time)
+                    return response
+
+                error = "%d %s" % (response.status_code, response.reason)
+
+            if response is None or response.status_code != 429:
+                # Being rate limited doesn't mean the data source is failing
+                with self.lock:
+                    self.failures += 1
+                self.breaker.failure()
+
+            if retry == self.retries or self.breaker.state() == CircuitBreaker.OPEN:
+                raise DataSourceRequestError(self.name(), error)
+
+            if response is not None and response.status_code == 429:
+                # Rate limited, so nothing more is sent to this data source until it's over
+                delay = self.get_retry_after(response)
+                self.limiter.pause(delay)
+            else:
+                delay = self.get_backoff(retry)
+                time.sleep(delay)
 
-        if response.status_code in [429, 502, 503, 504]:
-            response.raise_for_status()
+            if config.args.debug:
+                print("%sprice: %s %s, retry in %.1fs" % (
+                    Fore.YELLOW, self.name(), error, delay))
+
+    def get_coin_list(self, url, parse_coin_list):
+        # The coin list is cached, once the TTL expires it's revalidated, and if that's not
+        #  possible the cached list continues to be used
+        coin_list_cache = CoinListCache(self.name())
+        cached = coin_list_cache.load()
+        if cached and time.time() - cached['fetched'] < self.coin_list_ttl:
+            if config.args.debug:
+                print("%sprice: %s coin list cache loaded" % (Fore.YELLOW, self.name()))
+            return cached['coins']
 
-        if response:
-            return response.json()
-        return {}
+        headers = {}
+        if cached and cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
 
-    def update_prices(self, pair, prices, timestamp):
-        if pair not in self.prices:
-            self.prices[pair] = {}
+        try:
+            response = self.get_response(url, headers)
+        except DataSourceRequestError as e:
+            if not cached:
+                raise
 
-        # We are not interested in today's latest price, only the days closing price, also need to
-        #  filter any erroneous future dates returned
-        prices = {k: v
-                  for k, v in prices.items()
-                  if dateutil.parser.parse(k).date() < datetime.now().date()}
+            print("%sWARNING%s %s, using cached coin list" % (
+                Back.YELLOW+Fore.BLACK, Back.RESET+Fore.YELLOW, e))
+            return cached['coins']
 
-        # We might not receive data for the date requested, if so set to None to prevent repeat
-        #  lookups, assuming date is in the past
-        date = timestamp.strftime('%Y-%m-%d')
-        if date not in prices and timestamp.date() < datetime.now().date():
-            prices[date] = {'price': None,
-                            'url': None}
+        if cached and response.status_code == 304:
+            coin_list_cache.touch()
+            return cached['coins']
 
-        self.prices[pair].update(prices)
+        if response:
+            coins = parse_coin_list(response.json())
+            coin_list_cache.save(coins,
+                                 response.headers.get('ETag'),
+                                 response.headers.get('Last-Modified'))
+            return coins
+
+        if cached:
+            return cached['coins']
+        return parse_coin_list({})
+
+    def hedge_delay(self):
+        # How long to wait before the next data source is asked as well
+        if self.hedge_percentile is None or len(self.latencies) < self.HEDGE_MIN_SAMPLES:
+            return None
 
-    def load_prices(self):
-        filename = os.path.join(config.CACHE_DIR, self.name() + '.json')
-        if not os.path.exists(filename):
-            return {}
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * self.hedge_percentile / 100.0),
+                             len(latencies) - 1)]
+
+    def stats(self):
+        return "%s requests, %s failures, breaker %s (%s trips, %s rejected), " \
+               "%s hedged (%s won)" % (
+                   '{:,}'.format(self.requests),
+                   '{:,}'.format(self.failures),
+                   self.breaker.state(),
+                   '{:,}'.format(self.breaker.trips),
+                   '{:,}'.format(self.breaker.rejected),
+                   '{:,}'.format(self.hedged),
+                   '{:,}'.format(self.hedges_won))
+
+    def get_retry_after(self, response):
+        # Retry-After is either a number of seconds or a date
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                try:
+                    return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+                except (TypeError, ValueError):
+                    pass
+
+        return self.RETRY_AFTER
+
+    def get_backoff(self, retry):
+        # Exponential backoff with jitter, so retries from each worker are spread out
+        return random.uniform(0, min(self.BACKOFF * 2 ** retry, self.BACKOFF_MAX))
+
+    def get_historical_end(self, timestamp):
+        # Last date included in the prices returned by get_historical() for the timestamp
+        return timestamp.date()
+
+    def update_prices(self, pair, prices, timestamp, start=None):
+        # We are not interested in today's latest price, only the days closing price, also
+        #  need to filter any erroneous future dates returned, dates are ISO so compare as text
+        today = datetime.now().strftime('%Y-%m-%d')
+        series, missing = PriceSeries.from_prices({k: v for k, v in prices.items() if k < today})
+        self.store_series(pair, series, missing, timestamp, start)
+
+    def update_series(self, pair, days, values, url, timestamp, start=None):
+        # Fast path for a series of prices (floats as returned in JSON) by day number, with a
+        #  value for each of the data source's fields
+        start_time = time.time()
+        today = datetime.now().toordinal()
+        points = [(day, value) for day, value in zip(days, values) if day < today]
+        series, missing = PriceSeries.from_floats([point[0] for point in points],
+                                                  [point[1] for point in points],
+                                                  url,
+                                                  self.FIELDS)
+        self.store_series(pair, series, missing, timestamp, start)
 
-        try:
-            with open(filename, 'r') as price_cache:
-                json_prices = json.load(price_cache)
-                return {pair: {date: {'price': self.str_to_decimal(price['price']),
-                                      'url': price['url']}
-                               for date, price in json_prices[pair].items()}
-                        for pair in json_prices}
-        except:
-            print("%sWARNING%s Data cached for %s could not be loaded" % (
-                Back.YELLOW+Fore.BLACK, Back.RESET+Fore.YELLOW, self.name()))
-            return {}
-
-    def dump_prices(self):
-        with open(os.path.join(config.CACHE_DIR, self.name() + '.json'), 'w') as price_cache:
-            json_prices = {pair: {date: {'price': self.decimal_to_str(price['price']),
-                                         'url': price['url']}
-                                  for date, price in self.prices[pair].items()}
-                           for pair in self.prices}
-            json.dump(json_prices, price_cache, indent=4, sort_keys=True)
+        if config.args.debug:
+            elapsed = time.time() - start_time
+            print("%sprice: %s (%s) %s prices ingested, %s/s" % (
+                Fore.YELLOW,
+                self.name(),
+                pair,
+                '{:,}'.format(len(days)),
+                '{:,.0f}'.format(len(days) / elapsed) if elapsed else '-'))
+
+    def store_series(self, pair, series, missing, timestamp, start):
+        # The request covers the dates returned, and the date requested, any without a
+        #  price are missing, assuming the date is in the past
+        days = set(missing)
+        if series.days:
+            days.update((series.days[0], series.days[-1]))
+        if timestamp.date() < datetime.now().date():
+            days.add(timestamp.toordinal())
+
+        if days:
+            with self.lock:
+                self.prices.update(pair, series, missing,
+                                   start or self.iso_date(min(days)), self.iso_date(max(days)))
 
     def get_config_assets(self):
         for symbol in config.data_source_select:
@@ -135,6 +306,28 @@ class DataSourceBase(object):
         else:
             raise UnexpectedDataSourceAssetIdError(data_source, symbol)
 
+    def batch_assets(self, assets):
+        # Assets which can be priced by a single get_latest_batch() request
+        return [[asset] for asset in assets]
+
+    def get_latest_batch(self, assets, quote):
+        # Data sources with a multi-symbol API override this, and batch_assets()
+        return {asset: self.get_latest(asset, quote) for asset in assets}
+
+    @staticmethod
+    def split_batches(assets, symbols, max_length):
+        # Split into batches where the comma separated symbols fit within the maximum length
+        batches = []
+        length = 0
+        for asset in assets:
+            if not batches or length + len(symbols[asset]) + 1 > max_length:
+                batches.append([])
+                length = -1
+
+            batches[-1].append(asset)
+            length += len(symbols[asset]) + 1
+        return batches
+
     def get_list(self):
         if self.ids:
             asset_list = {}
@@ -152,18 +345,20 @@ class DataSourceBase(object):
         return asset + '/' + quote
 
     @staticmethod
-    def str_to_decimal(price):
-        if price:
-            return Decimal(price)
-
-        return None
+    def epoch_days(times, utc=True):
+        # Epoch times are converted to day numbers, in UTC or local time, without building a
+        #  datetime for each one
+        if utc:
+            return [int(t) // 86400 + EPOCH_DAY for t in times]
+        return [(int(t) + time.localtime(t).tm_gmtoff) // 86400 + EPOCH_DAY for t in times]
 
     @staticmethod
-    def decimal_to_str(price):
-        if price:
-            return '{0:f}'.format(price)
+    def iso_days(dates):
+        return [PriceSeries.day_number(date) for date in dates]
 
-        return None
+    @staticmethod
+    def iso_date(day):
+        return datetime.fromordinal(day).strftime('%Y-%m-%d')
 
     @staticmethod
     def epoch_time(timestamp):
@@ -171,6 +366,7 @@ class DataSourceBase(object):
         return int(epoch)
 
 class ExchangeRatesAPI(DataSourceBase):
+    BASE_URL = "https://api.exchangeratesapi.io"
     def __init__(self):
         super(ExchangeRatesAPI, self).__init__()
         currencies = ['EUR', 'USD', 'JPY', 'BGN', 'CYP', 'CZK', 'DKK', 'EEK', 'GBP', 'HUF',
@@ -181,14 +377,14 @@ class ExchangeRatesAPI(DataSourceBase):
         self.assets = {c: {'name': 'Fiat ' + c} for c in currencies}
 
     def get_latest(self, asset, quote, _asset_id=None):
-        url = "https://api.exchangeratesapi.io/latest?base=%s&symbols=%s" % (asset, quote)
+        url = "%s/latest?base=%s&symbols=%s" % (self.base_url, asset, quote)
         json_resp = self.get_json(url)
         return Decimal(repr(json_resp['rates'][quote])) \
                 if 'rates' in json_resp and quote in json_resp['rates'] else None
 
     def get_historical(self, asset, quote, timestamp, _asset_id=None):
-        url = "https://api.exchangeratesapi.io/%s?base=%s&symbols=%s" % (
-            timestamp.strftime('%Y-%m-%d'), asset, quote)
+        url = "%s/%s?base=%s&symbols=%s" % (
+            self.base_url, timestamp.strftime('%Y-%m-%d'), asset, quote)
         json_resp = self.get_json(url)
         pair = self.pair(asset, quote)
         # Date returned in response might not be date requested due to weekends/holidays
@@ -204,6 +400,7 @@ class ExchangeRatesAPI(DataSourceBase):
         return {k: [{'id':None, 'name': v['name']}] for k, v in self.assets.items()}
 
 class RatesAPI(DataSourceBase):
+    BASE_URL = "https://api.ratesapi.io"
     def __init__(self):
         super(RatesAPI, self).__init__()
         # https://github.com/MicroPyramid/ratesapi/blob/master/scripts/pusher.py
@@ -216,14 +413,14 @@ class RatesAPI(DataSourceBase):
 
     def get_latest(self, asset, quote, _asset_id=None):
         json_resp = self.get_json(
-            "https://api.ratesapi.io/api/latest?base=%s&symbols=%s" % (asset, quote)
+            "%s/api/latest?base=%s&symbols=%s" % (self.base_url, asset, quote)
         )
         return Decimal(repr(json_resp['rates'][quote])) \
                 if 'rates' in json_resp and quote in json_resp['rates'] else None
 
     def get_historical(self, asset, quote, timestamp, _asset_id=None):
-        url = "https://api.ratesapi.io/api/%s?base=%s&symbols=%s" % (
-            timestamp.strftime('%Y-%m-%d'), asset, quote)
+        url = "%s/api/%s?base=%s&symbols=%s" % (
+            self.base_url, timestamp.strftime('%Y-%m-%d'), asset, quote)
         json_resp = self.get_json(url)
         pair = self.pair(asset, quote)
         # Date returned in response might not be date requested due to weekends/holidays
@@ -236,6 +433,7 @@ class RatesAPI(DataSourceBase):
                            timestamp)
 
 class Frankfurter(DataSourceBase):
+    BASE_URL = "https://api.frankfurter.app"
     def __init__(self):
         super(Frankfurter, self).__init__()
         currencies = ['EUR', 'USD', 'JPY', 'BGN', 'CYP', 'CZK', 'DKK', 'EEK', 'GBP', 'HUF',
@@ -247,14 +445,14 @@ class Frankfurter(DataSourceBase):
 
     def get_latest(self, asset, quote, _asset_id=None):
         json_resp = self.get_json(
-            "https://api.frankfurter.app/latest?from=%s&to=%s" % (asset, quote)
+            "%s/latest?from=%s&to=%s" % (self.base_url, asset, quote)
         )
         return Decimal(repr(json_resp['rates'][quote])) \
                 if 'rates' in json_resp and quote in json_resp['rates'] else None
 
     def get_historical(self, asset, quote, timestamp, _asset_id=None):
-        url = "https://api.frankfurter.app/%s?from=%s&to=%s" % (
-            timestamp.strftime('%Y-%m-%d'), asset, quote)
+        url = "%s/%s?from=%s&to=%s" % (
+            self.base_url, timestamp.strftime('%Y-%m-%d'), asset, quote)
         json_resp = self.get_json(url)
         pair = self.pair(asset, quote)
         # Date returned in response might not be date requested due to weekends/holidays
@@ -267,112 +465,183 @@ class Frankfurter(DataSourceBase):
                            timestamp)
 
 class CoinDesk(DataSourceBase):
+    BASE_URL = "https://api.coindesk.com"
     def __init__(self):
         super(CoinDesk, self).__init__()
         self.assets = {'BTC': {'name': 'Bitcoin'}}
 
+    def get_historical_end(self, timestamp):
+        return datetime.now().date()
+
     def get_latest(self, _asset, quote, _asset_id=None):
-        json_resp = self.get_json("https://api.coindesk.com/v1/bpi/currentprice.json")
+        json_resp = self.get_json("%s/v1/bpi/currentprice.json" % self.base_url)
         return Decimal(repr(json_resp['bpi'][quote]['rate_float'])) \
                 if 'bpi' in json_resp and quote in json_resp['bpi'] else None
 
     def get_historical(self, asset, quote, timestamp, _asset_id=None):
-        url = "https://api.coindesk.com/v1/bpi/historical/close.json" \
+        url = "%s/v1/bpi/historical/close.json" \
               "?start=%s&end=%s&currency=%s" % (
-                  timestamp.strftime('%Y-%m-%d'), datetime.now().strftime('%Y-%m-%d'), quote)
+                  self.base_url, timestamp.strftime('%Y-%m-%d'),
+                  datetime.now().strftime('%Y-%m-%d'), quote)
         json_resp = self.get_json(url)
         pair = self.pair(asset, quote)
         if 'bpi' in json_resp:
-            self.update_prices(pair,
-                               {k: {
-                                   'price': Decimal(repr(v)) if v else None,
-                                   'url': url} for k, v in json_resp['bpi'].items()},
+            self.update_series(pair,
+                               self.iso_days(json_resp['bpi'].keys()),
+                               json_resp['bpi'].values(),
+                               url,
                                timestamp)
 
 class CryptoCompare(DataSourceBase):
+    BASE_URL = "https://min-api.cryptocompare.com"
+    MAX_WORKERS = 4
+    REQUESTS_PER_SECOND = 10
+    FIELDS = OHLC
+
     def __init__(self):
         super(CryptoCompare, self).__init__()
-        json_resp = self.get_json("https://min-api.cryptocompare.com/data/all/coinlist")
-        self.assets = {c[1]['Symbol'].strip().upper(): {'name': c[1]['CoinName'].strip()}
-                       for c in json_resp['Data'].items()}
+        coins = self.get_coin_list("%s/data/all/coinlist" % self.base_url,
+                                   self.parse_coin_list)
+        self.assets = {c[1]: {'name': c[2]} for c in coins}
         # CryptoCompare symbols are unique, so no ID required
 
+    @staticmethod
+    def parse_coin_list(json_resp):
+        return [[None, c['Symbol'].strip().upper(), c['CoinName'].strip()]
+                for c in json_resp['Data'].values()]
+
+    def get_historical_end(self, timestamp):
+        # The last day is not relied upon, as the days returned are in UTC
+        return timestamp.date() + timedelta(days=CRYPTOCOMPARE_MAX_DAYS - 1)
+
     def get_latest(self, asset, quote, _asset_id=None):
-        json_resp = self.get_json("https://min-api.cryptocompare.com/data/price" \
-            "?extraParams=%s&fsym=%s&tsyms=%s" % (self.USER_AGENT, asset, quote))
+        json_resp = self.get_json("%s/data/price" \
+            "?extraParams=%s&fsym=%s&tsyms=%s" % (self.base_url, self.USER_AGENT, asset, quote))
         return Decimal(repr(json_resp[quote])) if quote in json_resp else None
 
+    def batch_assets(self, assets):
+        return self.split_batches(assets, {asset: asset for asset in assets},
+                                  CRYPTOCOMPARE_MAX_FSYMS)
+
+    def get_latest_batch(self, assets, quote):
+        json_resp = self.get_json("%s/data/pricemulti" \
+            "?extraParams=%s&fsyms=%s&tsyms=%s" % (
+                self.base_url, self.USER_AGENT, ','.join(assets), quote))
+        return {asset: Decimal(repr(json_resp[asset][quote]))
+                       if asset in json_resp and quote in json_resp[asset] else None
+                for asset in assets}
+
     def get_historical(self, asset, quote, timestamp, _asset_id=None):
-        url = "https://min-api.cryptocompare.com/data/histoday?tryConversion=false&aggregate=1&extraParams=%s" \
+        url = "%s/data/histoday?tryConversion=false&aggregate=1&extraParams=%s" \
               "&fsym=%s&tsym=%s&limit=%s&toTs=%d" % (
-                  self.USER_AGENT, asset, quote, CRYPTOCOMPARE_MAX_DAYS,
+                  self.base_url, self.USER_AGENT, asset, quote, CRYPTOCOMPARE_MAX_DAYS,
                   self.epoch_time(timestamp + timedelta(days=CRYPTOCOMPARE_MAX_DAYS)))
 
         json_resp = self.get_json(url)
         pair = self.pair(asset, quote)
         # Warning - CryptoCompare returns 0 as data for missing dates, convert these to None.
-        ohlc = config.data_source_time
         if 'Data' in json_resp:
-            self.update_prices(pair,
-                               {datetime.fromtimestamp(d['time']).strftime('%Y-%m-%d'): {
-                                   'price': Decimal(repr(d[ohlc])) if ohlc in d and
-                                                                      d[ohlc] else None,
-                                   'url': url} for d in json_resp['Data']},
+            self.update_series(pair,
+                               self.epoch_days([d['time'] for d in json_resp['Data']], utc=False),
+                               [[d.get(field) for field in OHLC] for d in json_resp['Data']],
+                               url,
                                timestamp)
 
     def get_list(self):
         return {k: [{'id':None, 'name': v['name']}] for k, v in self.assets.items()}
 
 class CoinGecko(DataSourceBase):
+    BASE_URL = "https://api.coingecko.com"
+    # Free API is limited to around 30 calls a minute
+    MAX_WORKERS = 1
+    REQUESTS_PER_SECOND = 0.5
+
     def __init__(self):
         super(CoinGecko, self).__init__()
-        json_resp = self.get_json("https://api.coingecko.com/api/v3/coins/list")
-        self.ids = {c['id']: {'symbol': c['symbol'].strip().upper(), 'name': c['name'].strip()}
-                    for c in json_resp}
-        self.assets = {c['symbol'].strip().upper(): {'id': c['id'], 'name': c['name'].strip()}
-                       for c in json_resp}
+        coins = self.get_coin_list("%s/api/v3/coins/list" % self.base_url,
+                                   self.parse_coin_list)
+        self.ids = {c[0]: {'symbol': c[1], 'name': c[2]} for c in coins}
+        self.assets = {c[1]: {'id': c[0], 'name': c[2]} for c in coins}
         self.get_config_assets()
 
+    @staticmethod
+    def parse_coin_list(json_resp):
+        return [[c['id'], c['symbol'].strip().upper(), c['name'].strip()] for c in json_resp]
+
+    def get_historical_end(self, timestamp):
+        # All prices up until today are returned
+        return datetime.now().date()
+
     def get_latest(self, asset, quote, asset_id=None):
         if asset_id is None:
             asset_id = self.assets[asset]['id']
 
-        json_resp = self.get_json("https://api.coingecko.com/api/v3/coins/%s?localization=false" \
-            "&community_data=false&developer_data=false" % asset_id)
+        json_resp = self.get_json("%s/api/v3/coins/%s?localization=false" \
+            "&community_data=false&developer_data=false" % (self.base_url, asset_id))
         return Decimal(repr(json_resp['market_data']['current_price'][quote.lower()])) \
                 if 'market_data' in json_resp and 'current_price' in json_resp['market_data'] and \
                 quote.lower() in json_resp['market_data']['current_price'] else None
 
+    def batch_assets(self, assets):
+        return self.split_batches(assets, {asset: self.assets[asset]['id'] for asset in assets},
+                                  COINGECKO_MAX_IDS)
+
+    def get_latest_batch(self, assets, quote):
+        asset_ids = {asset: self.assets[asset]['id'] for asset in assets}
+        json_resp = self.get_json("%s/api/v3/simple/price" \
+            "?ids=%s&vs_currencies=%s" % (
+                self.base_url, ','.join(asset_ids.values()), quote.lower()))
+        return {asset: Decimal(repr(json_resp[asset_ids[asset]][quote.lower()]))
+                       if asset_ids[asset] in json_resp and
+                       quote.lower() in json_resp[asset_ids[asset]] else None
+                for asset in assets}
+
     def get_historical(self, asset, quote, timestamp, asset_id=None):
         if asset_id is None:
             asset_id = self.assets[asset]['id']
 
-        url = "https://api.coingecko.com/api/v3/coins/%s/market_chart?vs_currency=%s&days=max" % (
-            asset_id, quote)
+        url = "%s/api/v3/coins/%s/market_chart?vs_currency=%s&days=max" % (
+            self.base_url, asset_id, quote)
         json_resp = self.get_json(url)
         pair = self.pair(asset, quote)
         if 'prices' in json_resp:
-            self.update_prices(pair,
-                               {datetime.utcfromtimestamp(p[0]/1000).strftime('%Y-%m-%d'): {
-                                   'price': Decimal(repr(p[1])) if p[1] else None,
-                                   'url': url} for p in json_resp['prices']},
-                               timestamp)
+            # All prices are returned, so any dates before are missing
+            self.update_series(pair,
+                               self.epoch_days([p[0] // 1000 for p in json_resp['prices']]),
+                               [p[1] for p in json_resp['prices']],
+                               url,
+                               timestamp,
+                               HISTORY_START)
 
 class CoinMarketCap(DataSourceBase):
+    BASE_URL = "https://web-api.coinmarketcap.com"
+    MAX_WORKERS = 1
+    REQUESTS_PER_SECOND = 1
+    FIELDS = OHLC
+
     def __init__(self):
         super(CoinMarketCap, self).__init__()
-        json_resp = self.get_json("https://web-api.coinmarketcap.com/v1/cryptocurrency/map")
-        self.ids = {c['id']: {'symbol': c['symbol'].strip().upper(), 'name': c['name'].strip()}
-                    for c in json_resp['data']}
-        self.assets = {c['symbol'].strip().upper(): {'id': c['id'], 'name': c['name'].strip()}
-                       for c in json_resp['data']}
+        coins = self.get_coin_list("%s/v1/cryptocurrency/map" % self.base_url,
+                                   self.parse_coin_list)
+        self.ids = {c[0]: {'symbol': c[1], 'name': c[2]} for c in coins}
+        self.assets = {c[1]: {'id': c[0], 'name': c[2]} for c in coins}
         self.get_config_assets()
 
+    @staticmethod
+    def parse_coin_list(json_resp):
+        return [[c['id'], c['symbol'].strip().upper(), c['name'].strip()]
+                for c in json_resp['data']]
+
+    def get_historical_end(self, timestamp):
+        # All prices up until today are returned
+        return datetime.now().date()
+
     def get_latest(self, asset, quote, asset_id=None):
         if asset_id is None:
             asset_id = self.assets[asset]['id']
 
-        json_resp = self.get_json("https://web-api.coinmarketcap.com/v1/cryptocurrency/quotes/latest?id=%d&convert=%s" % (asset_id, quote.upper()))
+        json_resp = self.get_json("%s/v1/cryptocurrency/quotes/latest?id=%d&convert=%s" % (
+            self.base_url, asset_id, quote.upper()))
         try:
             return Decimal(repr(json_resp['data'][str(asset_id)]['quote'][quote.upper()]['price']))
         except KeyError:
@@ -382,36 +651,45 @@ class CoinMarketCap(DataSourceBase):
         if asset_id is None:
             asset_id = self.assets[asset]['id']
 
-        url = "https://web-api.coinmarketcap.com/v1/cryptocurrency/ohlcv/historical?id=%d&convert=%s&time_start=2017-01-01&time_end=%s" % (
-            asset_id, quote.upper(), datetime.now().strftime('%Y-%m-%d'))
+        url = "%s/v1/cryptocurrency/ohlcv/historical?id=%d&convert=%s&time_start=2017-01-01&time_end=%s" % (
+            self.base_url, asset_id, quote.upper(), datetime.now().strftime('%Y-%m-%d'))
         json_resp = self.get_json(url)
         pair = self.pair(asset, quote)
-        ohlc = config.data_source_time
         if 'data' in json_resp and 'quotes' in json_resp['data']:
-            self.update_prices(pair,
-                               {datetime.strptime(p['time_open'], "%Y-%m-%dT%H:%M:%S.%fZ").strftime('%Y-%m-%d'): {
-                                   'price': Decimal(repr(p['quote'][quote.upper()][ohlc]))
-                                            if 'quote' in p and quote.upper() in p['quote'] and ohlc in p['quote'][quote.upper()] else None,
-                                   'url': url} for p in json_resp['data']['quotes']},
+            self.update_series(pair,
+                               self.iso_days([p['time_open'] for p in json_resp['data']['quotes']]),
+                               [[p['quote'][quote.upper()].get(field) for field in OHLC]
+                                if 'quote' in p and quote.upper() in p['quote'] else [None] * 4
+                                for p in json_resp['data']['quotes']],
+                               url,
                                timestamp)
 
 
 class CoinPaprika(DataSourceBase):
+    BASE_URL = "https://api.coinpaprika.com"
+    MAX_WORKERS = 4
+    REQUESTS_PER_SECOND = 5
+
     def __init__(self):
         super(CoinPaprika, self).__init__()
-        json_resp = self.get_json("https://api.coinpaprika.com/v1/coins")
-        self.ids = {c['id']: {'symbol': c['symbol'].strip().upper(), 'name': c['name'].strip()}
-                    for c in json_resp}
-        self.assets = {c['symbol'].strip().upper(): {'id': c['id'], 'name': c['name'].strip()}
-                       for c in json_resp}
+        coins = self.get_coin_list("%s/v1/coins" % self.base_url, self.parse_coin_list)
+        self.ids = {c[0]: {'symbol': c[1], 'name': c[2]} for c in coins}
+        self.assets = {c[1]: {'id': c[0], 'name': c[2]} for c in coins}
         self.get_config_assets()
 
+    @staticmethod
+    def parse_coin_list(json_resp):
+        return [[c['id'], c['symbol'].strip().upper(), c['name'].strip()] for c in json_resp]
+
+    def get_historical_end(self, timestamp):
+        return timestamp.date() + timedelta(days=COINPAPRIKA_MAX_DAYS - 1)
+
     def get_latest(self, asset, quote, asset_id=None):
         if asset_id is None:
             asset_id = self.assets[asset]['id']
 
-        json_resp = self.get_json("https://api.coinpaprika.com/v1/tickers/%s?quotes=%s" % (
-            (asset_id, quote)))
+        json_resp = self.get_json("%s/v1/tickers/%s?quotes=%s" % (
+            self.base_url, asset_id, quote))
         return Decimal(repr(json_resp['quotes'][quote]['price'])) \
                 if 'quotes' in json_resp and quote in json_resp['quotes'] else None
 
@@ -423,14 +701,40 @@ class CoinPaprika(DataSourceBase):
         if asset_id is None:
             asset_id = self.assets[asset]['id']
 
-        url = "https://api.coinpaprika.com/v1/tickers/%s/historical" \
+        url = "%s/v1/tickers/%s/historical" \
               "?start=%s&limit=%s&quote=%s&interval=1d" % (
-                  asset_id, timestamp.strftime('%Y-%m-%d'), COINPAPRIKA_MAX_DAYS, quote)
+                  self.base_url, asset_id, timestamp.strftime('%Y-%m-%d'), COINPAPRIKA_MAX_DAYS,
+                  quote)
 
         json_resp = self.get_json(url)
         pair = self.pair(asset, quote)
-        self.update_prices(pair,
-                           {dateutil.parser.parse(p['timestamp']).strftime('%Y-%m-%d'): {
-                               'price': Decimal(repr(p['price'])) if p['price'] else None,
-                               'url': url} for p in json_resp},
+        self.update_series(pair,
+                           self.iso_days([p['timestamp'] for p in json_resp]),
+                           [p['price'] for p in json_resp],
+                           url,
                            timestamp)
+
+class DataSources(object):
+    # Data sources are only constructed the first time they are used, as each one may need to
+    #  request its coin list
+    def __init__(self, names):
+        self.classes = {data_source_class.__name__.upper(): data_source_class
+                        for data_source_class in DataSourceBase.__subclasses__()
+                        if data_source_class.__name__.upper() in names}
+        self.instances = {}
+        self.lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self.classes
+
+    def __getitem__(self, name):
+        with self.lock:
+            if name not in self.instances:
+                self.instances[name] = self.classes[name]()
+            return self.instances[name]
+
+    def __iter__(self):
+        return iter(self.classes)
+
+    def __len__(self):
+        return len(self.classes)
@@ -18,6 +18,15 @@ class UnexpectedDataSourceError(DataSourceError):
             os.path.join(config.BITTYTAX_PATH, config.BITTYTAX_CONFIG),
             ','.join([ds.__name__ for ds in self.value.__subclasses__()]))
 
+class DataSourceRequestError(DataSourceError):
+    def __str__(self):
+        return "Request to %s failed after retrying: %s" % (self.data_source, self.value)
+
+class DataSourceUnavailableError(DataSourceRequestError):
+    def __str__(self):
+        return "Requests to %s suspended after repeated failures, trying again in %ds" % (
+            self.data_source, self.value)
+
 class UnexpectedDataSourceAssetIdError(DataSourceError):
     def __str__(self):
         return "Invalid data source asset ID: \'%s\' for \'%s\' in %s" % (
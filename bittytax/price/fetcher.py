@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from colorama import Fore
+from tqdm import tqdm
+
+from ..config import config
+from .exceptions import DataSourceRequestError
+
+class RateLimiter(object):
+    def __init__(self, max_workers, requests_per_second):
+        self.semaphore = threading.BoundedSemaphore(max_workers)
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0
+        self.lock = threading.Lock()
+        self.next_time = 0
+
+    def __enter__(self):
+        self.semaphore.acquire()
+        # Each request is given the next free slot, so requests are spaced evenly
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+
+        if wait > 0:
+            time.sleep(wait)
+        return self
+
+    def __exit__(self, *args):
+        self.semaphore.release()
+
+    def pause(self, seconds):
+        # Nothing more is sent until the pause is over (i.e. after a 429 Retry-After)
+        with self.lock:
+            self.next_time = max(self.next_time, time.monotonic() + seconds)
+
+class CircuitBreaker(object):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failures, cool_down):
+        # After a number of consecutive failures nothing more is sent until the cool down is
+        #  over, then a single trial request decides if it's closed again, 0 disables it
+        self.failures = failures
+        self.cool_down = cool_down
+        self.lock = threading.Lock()
+        self.consecutive = 0
+        self.open_until = None
+        self.trial = False
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self):
+        with self.lock:
+            if self.open_until is None:
+                return True
+
+            if self.trial or time.monotonic() < self.open_until:
+                self.rejected += 1
+                return False
+
+            self.trial = True
+            return True
+
+    def success(self):
+        with self.lock:
+            self.consecutive = 0
+            self.open_until = None
+            self.trial = False
+
+    def failure(self):
+        with self.lock:
+            self.consecutive += 1
+            if self.trial or self.open_until is None and self.failures and \
+                    self.consecutive >= self.failures:
+                self.trips += 1
+                self.open_until = time.monotonic() + self.cool_down
+            self.trial = False
+
+    def remaining(self):
+        with self.lock:
+            if self.open_until is None:
+                return 0
+            return max(self.open_until - time.monotonic(), 0)
+
+    def state(self):
+        with self.lock:
+            if self.open_until is None:
+                return self.CLOSED
+            if self.trial or time.monotonic() >= self.open_until:
+                return self.HALF_OPEN
+            return self.OPEN
+
+class PriceFetcher(object):
+    def __init__(self, desc):
+        self.desc = desc
+
+    def fetch(self, requests):
+        # Requests are (data source, function, args), each data source has its own workers so
+        #  a slow source doesn't hold up the others
+        executors = {}
+        futures = []
+        errors = {}
+        try:
+            for ds, function, args in requests:
+                if ds.name() not in executors:
+                    executors[ds.name()] = ThreadPoolExecutor(max_workers=ds.max_workers)
+                futures.append(executors[ds.name()].submit(function, *args))
+
+            for future in tqdm(as_completed(futures),
+                               total=len(futures),
+                               unit='req',
+                               desc="%s%s%s" % (Fore.CYAN, self.desc, Fore.GREEN),
+                               disable=bool(config.args.debug or not sys.stdout.isatty())):
+                try:
+                    future.result()
+                except DataSourceRequestError as e:
+                    # Left for when the price is looked up, so the next data source can be tried
+                    errors.setdefault(e.data_source, e)
+        finally:
+            for future in futures:
+                future.cancel()
+
+            for executor in executors.values():
+                executor.shutdown(wait=True)
+
+        if config.args.debug:
+            for e in errors.values():
+                print("%sprice: %s" % (Fore.YELLOW, e))
@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+from decimal import Decimal, Context
+
+from colorama import Fore, Back
+
+from ..config import config
+
+class CacheDatabase(object):
+    FILENAME = 'prices.db'
+    TIME_OUT = 30
+
+    def __init__(self, data_source):
+        self.data_source = data_source
+        self.lock = threading.RLock()
+        self.connection = None
+        self.pid = None
+
+    def connect(self):
+        # A connection can't be shared with a forked process, so each has its own
+        if self.connection is None or self.pid != os.getpid():
+            try:
+                os.makedirs(config.CACHE_DIR)
+            except OSError:
+                if not os.path.isdir(config.CACHE_DIR):
+                    raise
+
+            self.connection = sqlite3.connect(os.path.join(config.CACHE_DIR, self.FILENAME),
+                                              timeout=self.TIME_OUT,
+                                              check_same_thread=False)
+            self.pid = os.getpid()
+
+            # Write-ahead logging allows other processes to read while the cache is written
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            with self.connection:
+                self.connection.execute("CREATE TABLE IF NOT EXISTS series ("
+                                        "data_source TEXT NOT NULL, "
+                                        "pair TEXT NOT NULL, "
+                                        "days BLOB NOT NULL, "
+                                        "coefficients BLOB NOT NULL, "
+                                        "exponents BLOB NOT NULL, "
+                                        "url_index BLOB NOT NULL, "
+                                        "urls TEXT NOT NULL, "
+                                        "fields TEXT NOT NULL DEFAULT '[\"price\"]', "
+                                        "PRIMARY KEY (data_source, pair))")
+                self.connection.execute("CREATE TABLE IF NOT EXISTS coverage ("
+                                        "data_source TEXT NOT NULL, "
+                                        "pair TEXT NOT NULL, "
+                                        "start TEXT NOT NULL, "
+                                        "end TEXT NOT NULL, "
+                                        "fetched REAL NOT NULL)")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS coverage_pair "
+                                        "ON coverage (data_source, pair)")
+                self.connection.execute("CREATE TABLE IF NOT EXISTS coin_lists ("
+                                        "data_source TEXT PRIMARY KEY, "
+                                        "fetched REAL NOT NULL, "
+                                        "etag TEXT, "
+                                        "last_modified TEXT, "
+                                        "coins TEXT NOT NULL)")
+            self.opened()
+
+        return self.connection
+
+    def opened(self):
+        pass
+
+PRICE = ('price',)
+OHLC = ('open', 'high', 'low', 'close')
+
+class PriceSeries(object):
+    # Prices for a pair are held in arrays, sorted by day number, with each price stored as an
+    #  integer coefficient and exponent, and its URL as an index into the URLs requested. Where
+    #  a data source gives more than one price for a day (open, high, low, close), the fields
+    #  of each day are stored together, a coefficient of 0 being a missing field
+    MAX_COEFFICIENT = 2 ** 63
+
+    def __init__(self, fields=PRICE, days=None, coefficients=None, exponents=None,
+                 url_index=None, urls=None):
+        self.fields = tuple(fields)
+        self.days = days if days is not None else array('i')
+        self.coefficients = coefficients if coefficients is not None else array('q')
+        self.exponents = exponents if exponents is not None else array('b')
+        self.url_index = url_index if url_index is not None else array('I')
+        self.urls = urls if urls is not None else []
+
+    @classmethod
+    def from_row(cls, row):
+        if row is None:
+            return cls()
+
+        return cls(json.loads(row[5]),
+                   cls.from_bytes('i', row[0]),
+                   cls.from_bytes('q', row[1]),
+                   cls.from_bytes('b', row[2]),
+                   cls.from_bytes('I', row[3]),
+                   json.loads(row[4]))
+
+    def to_row(self):
+        return (self.days.tobytes(),
+                self.coefficients.tobytes(),
+                self.exponents.tobytes(),
+                self.url_index.tobytes(),
+                json.dumps(self.urls),
+                json.dumps(self.fields))
+
+    def __len__(self):
+        return len(self.days)
+
+    def has_field(self, field):
+        return field in self.fields or field == 'avg' and all(f in self.fields for f in OHLC)
+
+    def get(self, date, field):
+        day = self.day_number(date)
+        i = bisect_left(self.days, day)
+        if i < len(self.days) and self.days[i] == day:
+            return self.get_index(i, field)
+        return None
+
+    def get_index(self, i, field):
+        # A single price is used whichever field is asked for
+        if self.fields == PRICE:
+            price = self.decode(i)
+        elif field in self.fields:
+            price = self.decode(i * len(self.fields) + self.fields.index(field))
+        else:
+            prices = [self.decode(i * len(self.fields) + self.fields.index(f)) for f in OHLC]
+            price = sum(prices) / len(prices) if None not in prices else None
+
+        return {'price': price,
+                'url': self.urls[self.url_index[i]]}
+
+    def decode(self, j):
+        if self.coefficients[j]:
+            return Decimal(self.coefficients[j]).scaleb(self.exponents[j])
+        return None
+
+    def items(self):
+        return {datetime.fromordinal(day).strftime('%Y-%m-%d'): self.get_index(i, self.fields[0])
+                for i, day in enumerate(self.days)}
+
+    def merge(self, prices):
+        # Prices are merged by day, a price which is now missing is removed
+        self.merge_series(*self.from_prices(prices))
+
+    def merge_series(self, series, missing):
+        if not self.days:
+            self.fields = series.fields
+
+        if self.fields != series.fields:
+            raise ValueError("series fields %s and %s differ" % (self.fields, series.fields))
+
+        if not self.days or series.days and series.days[0] > self.days[-1] and \
+                all(day > self.days[-1] for day in missing):
+            # Later prices are just appended, as each request usually follows on from the last
+            urls = [self.add_url(url) for url in series.urls]
+            self.days.extend(series.days)
+            self.coefficients.extend(series.coefficients)
+            self.exponents.extend(series.exponents)
+            self.url_index.extend(array('I', [urls[i] for i in series.url_index]))
+            return
+
+        points = self.to_points()
+        for day in missing:
+            points.pop(day, None)
+        points.update(series.to_points())
+
+        merged = self.from_points(points, self.fields)
+        self.days, self.coefficients, self.exponents, self.url_index, self.urls = \
+            merged.days, merged.coefficients, merged.exponents, merged.url_index, merged.urls
+
+    def add_url(self, url):
+        if url not in self.urls:
+            self.urls.append(url)
+        return self.urls.index(url)
+
+    def to_points(self):
+        k = len(self.fields)
+        return {day: (self.coefficients[i * k:(i + 1) * k],
+                      self.exponents[i * k:(i + 1) * k],
+                      self.urls[self.url_index[i]])
+                for i, day in enumerate(self.days)}
+
+    @classmethod
+    def from_points(cls, points, fields=PRICE):
+        # Points are the (coefficients, exponents, url) of the fields for each day number
+        series = cls(fields)
+        series.days = array('i', sorted(points))
+        series.coefficients = array('q', [c for day in series.days for c in points[day][0]])
+        series.exponents = array('b', [e for day in series.days for e in points[day][1]])
+
+        # Each URL is only stored once, most cover many days
+        url_index = {}
+        for day in series.days:
+            if points[day][2] not in url_index:
+                url_index[points[day][2]] = len(series.urls)
+                series.urls.append(points[day][2])
+        series.url_index = array('I', [url_index[points[day][2]] for day in series.days])
+        return series
+
+    @classmethod
+    def from_prices(cls, prices):
+        # Returns the series for prices by date, and the days which are missing a price
+        points = {}
+        missing = set()
+        for date, price in prices.items():
+            day = cls.day_number(date)
+            encoded = cls.encode(price['price']) if price['price'] else None
+            if encoded:
+                points[day] = ((encoded[0],), (encoded[1],), price['url'])
+                missing.discard(day)
+            else:
+                points.pop(day, None)
+                missing.add(day)
+
+        return cls.from_points(points), missing
+
+    @classmethod
+    def from_floats(cls, days, values, url, fields=PRICE):
+        # Prices as returned in JSON, a value for each field of each day (or just the value for a
+        #  single field), are encoded straight from the repr of the float
+        points = {}
+        missing = set()
+        for day, value in zip(days, values):
+            encoded = [cls.encode_float(v) for v in value] if len(fields) > 1 \
+                    else [cls.encode_float(value)]
+            if any(encoded):
+                points[day] = encoded
+                missing.discard(day)
+            else:
+                points.pop(day, None)
+                missing.add(day)
+
+        series = cls(fields, urls=[url])
+        series.days = array('i', sorted(points))
+        series.coefficients = array('q', [e[0] if e else 0
+                                          for day in series.days for e in points[day]])
+        series.exponents = array('b', [e[1] if e else 0
+                                       for day in series.days for e in points[day]])
+        series.url_index = array('I', [0]) * len(series.days)
+        return series, missing
+
+    @staticmethod
+    def encode_float(value):
+        # Split into a coefficient and exponent, the same as Decimal(repr(value)) would give
+        if not value:
+            return None
+
+        mantissa, _, exponent = repr(value).partition('e')
+        whole, _, fraction = mantissa.partition('.')
+        exponent = (int(exponent) if exponent else 0) - len(fraction)
+        if not -128 <= exponent <= 127:
+            return None
+
+        return int(whole + fraction), exponent
+
+    @classmethod
+    def encode(cls, price):
+        sign, digits, exponent = price.as_tuple()
+        coefficient = int(''.join(map(str, digits)))
+        if coefficient >= cls.MAX_COEFFICIENT or not -128 <= exponent <= 127:
+            # Beyond the precision of any data source, so rounded to fit
+            sign, digits, exponent = Context(prec=18).create_decimal(price).normalize().as_tuple()
+            coefficient = int(''.join(map(str, digits)))
+            if not -128 <= exponent <= 127:
+                return None
+
+        return (-coefficient if sign else coefficient), exponent
+
+    @staticmethod
+    def day_number(date):
+        return datetime(int(date[0:4]), int(date[5:7]), int(date[8:10])).toordinal()
+
+    @staticmethod
+    def from_bytes(typecode, data):
+        # Arrays are stored in the byte order of this machine, the cache is never shared
+        values = array(typecode)
+        values.frombytes(data)
+        return values
+
+class PriceCache(CacheDatabase):
+    def __init__(self, data_source, negative_ttl, fields=PRICE):
+        super(PriceCache, self).__init__(data_source)
+        self.negative_ttl = negative_ttl
+        self.fields = tuple(fields)
+        self.prices = {}
+        # Date intervals each request for a pair has covered, and when
+        self.coverage = {}
+
+    def __contains__(self, pair):
+        return bool(self.load(pair))
+
+    def __getitem__(self, pair):
+        prices = self.load(pair)
+        if not prices:
+            raise KeyError(pair)
+        return prices
+
+    def __iter__(self):
+        with self.lock:
+            return iter([row[0] for row in self.connect().execute(
+                "SELECT pair FROM series WHERE data_source = ? ORDER BY pair",
+                (self.data_source,))])
+
+    def load(self, pair):
+        # Prices for a pair are only read from the cache the first time they are needed
+        with self.lock:
+            if pair not in self.prices:
+                self.prices[pair] = PriceSeries.from_row(self.select(self.connect(), pair))
+
+                self.coverage[pair] = self.connect().execute(
+                    "SELECT start, end, fetched FROM coverage "
+                    "WHERE data_source = ? AND pair = ?", (self.data_source, pair)).fetchall()
+
+                if self.prices[pair] and config.args.debug:
+                    print("%sprice: %s (%s) data cache loaded" % (
+                        Fore.YELLOW, self.data_source, pair))
+
+            return self.prices[pair]
+
+    def select(self, connection, pair):
+        return connection.execute("SELECT days, coefficients, exponents, url_index, urls, "
+                                  "fields FROM series WHERE data_source = ? AND pair = ?",
+                                  (self.data_source, pair)).fetchone()
+
+    def lookup(self, pair, date):
+        # Returns the cached price, or None if the data source needs to be asked, the field
+        #  (open, high, low, close or avg) is chosen by the config
+        with self.lock:
+            prices = self.load(pair)
+            if prices and prices.fields != self.fields and \
+                    not prices.has_field(config.data_source_time):
+                # Cached before the data source's fields were kept
+                return None
+
+            price = prices.get(date, config.data_source_time)
+            if price is not None and price['price'] is not None:
+                return price
+
+            # A missing price is only relied upon for a while, in case it's added later
+            fresh = [c for c in self.coverage[pair] if time.time() - c[2] < self.negative_ttl]
+            if any(c[0] <= date <= c[1] for c in fresh):
+                return {'price': None, 'url': None}
+
+            return None
+
+    def update(self, pair, series, missing, start, end):
+        # Each update is committed straight away, it's merged with the series in the database
+        #  as another process might have added to it
+        with self.lock:
+            self.load(pair)
+            fetched = time.time()
+
+            connection = self.connect()
+            with connection:
+                connection.execute("BEGIN IMMEDIATE")
+                stored = PriceSeries.from_row(self.select(connection, pair))
+                if stored and stored.fields != series.fields:
+                    # Cached with other fields, so it's replaced, along with what it covered
+                    stored = PriceSeries(series.fields)
+                    connection.execute("DELETE FROM coverage WHERE data_source = ? AND pair = ?",
+                                       (self.data_source, pair))
+                    self.coverage[pair] = []
+
+                stored.merge_series(series, missing)
+                connection.execute("INSERT OR REPLACE INTO series "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   (self.data_source, pair) + stored.to_row())
+                connection.execute("INSERT INTO coverage VALUES (?, ?, ?, ?, ?)",
+                                   (self.data_source, pair, start, end, fetched))
+
+            self.prices[pair] = stored
+            self.coverage[pair].append((start, end, fetched))
+
+    def opened(self):
+        self.migrate()
+
+    def migrate(self):
+        # Prices cached by previous versions are moved from the JSON file into the database
+        filename = os.path.join(config.CACHE_DIR, self.data_source + '.json')
+        if not os.path.exists(filename):
+            return
+
+        try:
+            with open(filename, 'r') as price_cache:
+                json_prices = json.load(price_cache)
+
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                for pair in json_prices:
+                    # Prices already in the database are kept
+                    series = PriceSeries.from_row(self.select(self.connection, pair))
+                    if series.fields != PRICE:
+                        continue
+
+                    prices = {date: {'price': self.str_to_decimal(price['price']),
+                                     'url': price['url']}
+                              for date, price in json_prices[pair].items()}
+                    prices.update(series.items())
+                    series.merge(prices)
+                    self.connection.execute("INSERT OR REPLACE INTO series "
+                                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                            (self.data_source, pair) + series.to_row())
+        except (IOError, ValueError, KeyError, TypeError, sqlite3.Error):
+            print("%sWARNING%s Data cached for %s could not be migrated" % (
+                Back.YELLOW+Fore.BLACK, Back.RESET+Fore.YELLOW, self.data_source))
+            return
+
+        try:
+            os.rename(filename, filename + '.migrated')
+        except OSError:
+            # Already migrated by another process
+            pass
+
+        if config.args.debug:
+            print("%sprice: %s data cache migrated" % (Fore.YELLOW, self.data_source))
+
+    @staticmethod
+    def str_to_decimal(price):
+        if price:
+            return Decimal(price)
+
+        return None
+
+class CoinListCache(CacheDatabase):
+    def load(self):
+        with self.lock:
+            row = self.connect().execute("SELECT fetched, etag, last_modified, coins "
+                                         "FROM coin_lists WHERE data_source = ?",
+                                         (self.data_source,)).fetchone()
+        if row is None:
+            return None
+
+        return {'fetched': row[0],
+                'etag': row[1],
+                'last_modified': row[2],
+                'coins': json.loads(row[3])}
+
+    def save(self, coins, etag, last_modified):
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute("INSERT OR REPLACE INTO coin_lists VALUES (?, ?, ?, ?, ?)",
+                                   (self.data_source, time.time(), etag, last_modified,
+                                    json.dumps(coins)))
+
+    def touch(self):
+        # Revalidated, so the cached coin list is good for another TTL
+        with self.lock:
+            connection = self.connect()
+            with connection:
+                connection.execute("UPDATE coin_lists SET fetched = ? WHERE data_source = ?",
+                                   (time.time(), self.data_source))
@@ -2,18 +2,25 @@
 # (c) Nano Nano Ltd 2019
 
 import os
+import threading
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
-from colorama import Fore
+from colorama import Fore, Back
 
 from ..version import __version__
 from ..config import config
-from .datasource import DataSourceBase
-from .exceptions import UnexpectedDataSourceError
+from .datasource import DataSourceBase, DataSources
+from .fetcher import PriceFetcher, CircuitBreaker
+from .exceptions import UnexpectedDataSourceError, DataSourceRequestError
 
 class PriceData(object):
     def __init__(self, price_tool=False):
         self.price_tool = price_tool
-        self.data_sources = {}
+        self.latest = {}
+        self.failed = set()
+        # Historic prices already requested in this run, for each data source, pair and date
+        self.fetched = set()
 
         if not os.path.exists(config.CACHE_DIR):
             os.mkdir(config.CACHE_DIR)
@@ -23,9 +30,7 @@ class PriceData(object):
                                 {x.split(':')[0]
                                  for v in config.data_source_select.values() for x in v}
 
-        for data_source_class in DataSourceBase.__subclasses__():
-            if data_source_class.__name__.upper() in [ds.upper() for ds in data_sources_required]:
-                self.data_sources[data_source_class.__name__.upper()] = data_source_class()
+        self.data_sources = DataSources([ds.upper() for ds in data_sources_required])
 
     @staticmethod
     def data_source_priority(asset):
@@ -39,43 +44,95 @@ class PriceData(object):
     def get_latest_ds(self, data_source, asset, quote):
         if data_source.upper() in self.data_sources:
             if asset in self.data_sources[data_source.upper()].assets:
-                return self.data_sources[data_source.upper()].get_latest(asset, quote), \
+                # Latest prices are only requested once for each run
+                if (data_source.upper(), asset, quote) not in self.latest:
+                    self.latest[(data_source.upper(), asset, quote)] = \
+                            self.data_sources[data_source.upper()].get_latest(asset, quote)
+
+                return self.latest[(data_source.upper(), asset, quote)], \
                        self.data_sources[data_source.upper()].assets[asset]['name']
 
             return None, None
         else:
             raise UnexpectedDataSourceError(data_source, DataSourceBase)
 
+    def prefetch_latest(self, pairs):
+        # Only the first data source for each pair is fetched, if the price is not found the
+        #  next data source is tried when it's looked up, one which is not responding is skipped
+        assets = {}
+        for asset, quote in sorted(pairs):
+            for data_source in self.data_source_priority(asset):
+                if data_source.upper() not in self.data_sources:
+                    raise UnexpectedDataSourceError(data_source, DataSourceBase)
+
+                if asset in self.data_sources[data_source.upper()].assets and \
+                        self.data_sources[data_source.upper()].breaker.state() != \
+                        CircuitBreaker.OPEN:
+                    if (data_source.upper(), asset, quote) not in self.latest:
+                        assets.setdefault((data_source.upper(), quote), []).append(asset)
+                    break
+
+        # Assets are batched together where the data source allows
+        requests = []
+        for (data_source, quote), ds_assets in sorted(assets.items()):
+            for batch in self.data_sources[data_source].batch_assets(ds_assets):
+                requests.append((self.data_sources[data_source],
+                                 self.fetch_latest,
+                                 (data_source, batch, quote)))
+
+        PriceFetcher("fetch latest prices").fetch(requests)
+
+    def fetch_latest(self, data_source, assets, quote):
+        for asset, price in self.data_sources[data_source].get_latest_batch(assets,
+                                                                            quote).items():
+            self.latest[(data_source, asset, quote)] = price
+
     def get_historical_ds(self, data_source, asset, quote, timestamp):
         if data_source.upper() in self.data_sources:
             if asset in self.data_sources[data_source.upper()].assets:
                 date = timestamp.strftime('%Y-%m-%d')
                 pair = asset + '/' + quote
 
-                if not config.args.nocache:
+                if not config.args.nocache or \
+                        (data_source.upper(), pair, date) in self.fetched:
                     # check cache first
-                    if pair in self.data_sources[data_source.upper()].prices and \
-                       date in self.data_sources[data_source.upper()].prices[pair]:
-                        return self.data_sources[data_source.upper()].prices[pair][date]['price'], \
-                              self.data_sources[data_source.upper()].assets[asset]['name'], \
-                              self.data_sources[data_source.upper()].prices[pair][date]['url']
+                    cached = self.data_sources[data_source.upper()].prices.lookup(pair, date)
+                    if cached is not None:
+                        return cached['price'], \
+                               self.data_sources[data_source.upper()].assets[asset]['name'], \
+                               cached['url']
 
                 self.data_sources[data_source.upper()].get_historical(asset, quote, timestamp)
-                if pair in self.data_sources[data_source.upper()].prices and \
-                   date in self.data_sources[data_source.upper()].prices[pair]:
-                    return self.data_sources[data_source.upper()].prices[pair][date]['price'], \
+                self.fetched.add((data_source.upper(), pair, date))
+                cached = self.data_sources[data_source.upper()].prices.lookup(pair, date)
+                if cached is not None:
+                    return cached['price'], \
                            self.data_sources[data_source.upper()].assets[asset]['name'], \
-                           self.data_sources[data_source.upper()].prices[pair][date]['url']
+                           cached['url']
                 return None, self.data_sources[data_source.upper()].assets[asset]['name'], None
             else:
                 return None, None, None
         else:
             raise UnexpectedDataSourceError(data_source, DataSourceBase)
 
+    def request_failed(self, e):
+        # If a data source can't be reached the next one is tried, this is only reported once
+        if e.data_source not in self.failed:
+            self.failed.add(e.data_source)
+            print("%sWARNING%s %s, trying the next data source" % (
+                Back.YELLOW+Fore.BLACK, Back.RESET+Fore.YELLOW, e))
+
     def get_latest(self, asset, quote):
         name = None
+        error = None
         for data_source in self.data_source_priority(asset):
-            price, name = self.get_latest_ds(data_source, asset, quote)
+            try:
+                price, name = self.get_latest_ds(data_source, asset, quote)
+            except DataSourceRequestError as e:
+                self.request_failed(e)
+                error = error or e
+                continue
+
             if price is not None:
                 if config.args.debug:
                     print("%sprice: <latest>, 1 %s=%s %s via %s (%s)" % (
@@ -95,12 +152,89 @@ class PriceData(object):
                         self.data_sources[data_source.upper()].name(),
                         name))
                 return price, name, self.data_sources[data_source.upper()].name()
+
+        if error:
+            # No other data source had the price, so it's not known to be missing
+            raise error
         return None, name, None
 
+    def hedge(self, data_source, asset, quote, timestamp):
+        # Only requests which are not already cached are hedged
+        if data_source.upper() not in self.data_sources:
+            return False
+
+        ds = self.data_sources[data_source.upper()]
+        pair = ds.pair(asset, quote)
+        date = timestamp.strftime('%Y-%m-%d')
+        return asset in ds.assets and ds.hedge_delay() is not None and \
+            ((config.args.nocache and (data_source.upper(), pair, date) not in self.fetched) or
+             ds.prices.lookup(pair, date) is None)
+
+    def get_historical_hedged(self, data_source, next_data_source, asset, quote, timestamp,
+                              pending):
+        # If the data source is slower than usual, the next data source is asked as well, and
+        #  whichever has the price first is used
+        ds = self.data_sources[data_source.upper()]
+        future = self.submit(self.get_historical_ds, data_source, asset, quote, timestamp)
+        try:
+            return data_source, future.result(timeout=ds.hedge_delay())
+        except FutureTimeoutError:
+            pass
+
+        with ds.lock:
+            ds.hedged += 1
+
+        if config.args.debug:
+            print("%sprice: %s slow for %s, also asking %s" % (
+                Fore.YELLOW, ds.name(), timestamp.strftime('%Y-%m-%d'), next_data_source))
+
+        hedge = pending[next_data_source] = self.submit(self.get_historical_ds,
+                                                        next_data_source, asset, quote, timestamp)
+        done, _ = wait([future, hedge], return_when=FIRST_COMPLETED)
+        if future not in done and hedge.exception() is None and hedge.result()[0] is not None:
+            with ds.lock:
+                ds.hedges_won += 1
+            del pending[next_data_source]
+            return next_data_source, hedge.result()
+
+        return data_source, future.result()
+
+    @staticmethod
+    def submit(function, *args):
+        # A daemon thread is used, so a request still running after the hedge has won doesn't
+        #  hold up the exit
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
     def get_historical(self, asset, quote, timestamp):
         name = None
-        for data_source in self.data_source_priority(asset):
-            price, name, url = self.get_historical_ds(data_source, asset, quote, timestamp)
+        error = None
+        pending = {}
+        data_sources = self.data_source_priority(asset)
+        for i, data_source in enumerate(data_sources):
+            try:
+                if data_source in pending:
+                    price, name, url = pending.pop(data_source).result()
+                elif i + 1 < len(data_sources) and \
+                        self.hedge(data_source, asset, quote, timestamp):
+                    data_source, (price, name, url) = self.get_historical_hedged(
+                        data_source, data_sources[i + 1], asset, quote, timestamp, pending)
+                else:
+                    price, name, url = self.get_historical_ds(data_source, asset, quote,
+                                                              timestamp)
+            except DataSourceRequestError as e:
+                self.request_failed(e)
+                error = error or e
+                continue
+
             if price is not None:
                 if config.args.debug:
                     print("%sprice: %s, 1 %s = %s %s via %s (%s)" % (
@@ -121,4 +255,12 @@ class PriceData(object):
                         self.data_sources[data_source.upper()].name(),
                         name))
                 return price, name, self.data_sources[data_source.upper()].name(), url
+
+        if error:
+            raise error
         return None, name, None, None
+
+    def output_stats(self):
+        # Request counters for each data source used
+        for _, ds in sorted(self.data_sources.instances.items()):
+            print("%sprice: %s %s" % (Fore.YELLOW, ds.name(), ds.stats()))
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+from colorama import Fore
+
+from ..config import config
+from .datasource import DataSourceBase
+from .fetcher import PriceFetcher, CircuitBreaker
+from .exceptions import UnexpectedDataSourceError
+
+class PricePlan(object):
+    def __init__(self, price_data):
+        self.price_data = price_data
+        # Dates required, and those already cached, for each data source and pair
+        self.required = {}
+        self.cached = {}
+        self.unavailable = set()
+        self.missing = set()
+        self.requests = []
+
+    def add(self, asset, quote, timestamp):
+        # Follows the same data source priority as PriceData.get_historical()
+        date = timestamp.strftime('%Y-%m-%d')
+        pair = DataSourceBase.pair(asset, quote)
+        missing = False
+
+        for data_source in self.price_data.data_source_priority(asset):
+            if data_source.upper() not in self.price_data.data_sources:
+                raise UnexpectedDataSourceError(data_source, DataSourceBase)
+
+            ds = self.price_data.data_sources[data_source.upper()]
+            if asset not in ds.assets:
+                continue
+
+            key = (ds.name(), pair)
+            # Bypassing the cache, every date is requested again
+            cached = ds.prices.lookup(pair, date) if not config.args.nocache else None
+            if cached is not None:
+                if cached['price'] is None:
+                    # Already known to be missing, so the next data source is tried
+                    missing = True
+                    continue
+
+                self.cached.setdefault(key, set()).add(date)
+            elif ds.breaker.state() == CircuitBreaker.OPEN:
+                # Not responding, so the next data source will be used
+                continue
+            else:
+                self.required.setdefault(key, {})[date] = timestamp
+            return
+
+        if missing:
+            self.missing.add(asset)
+        else:
+            self.unavailable.add(asset)
+
+    def plan(self):
+        # Each request covers a range of dates, so only the first date not covered by the
+        #  previous request needs another
+        self.requests = []
+        for (data_source, pair), dates in sorted(self.required.items()):
+            ds = self.price_data.data_sources[data_source.upper()]
+            asset, quote = pair.split('/')
+            end = None
+            for date in sorted(dates):
+                if end is None or dates[date].date() > end:
+                    end = ds.get_historical_end(dates[date])
+                    self.requests.append((ds, asset, quote, dates[date]))
+        return self.requests
+
+    def prefetch(self):
+        if config.args.debug:
+            print("%sprefetch prices (requests=%d)" % (Fore.CYAN, len(self.requests)))
+
+        PriceFetcher("prefetch prices").fetch([(ds, ds.get_historical, (asset, quote, timestamp))
+                                               for ds, asset, quote, timestamp in self.requests])
+
+        # Even if the cache is bypassed, these dates are now taken from it for the rest of the run
+        for (data_source, pair), dates in self.required.items():
+            for date in dates:
+                self.price_data.fetched.add((data_source.upper(), pair, date))
+
+        # If a data source stopped responding, its dates are planned again so the next data
+        #  source is prefetched instead
+        failing = [(data_source, pair, dates) for (data_source, pair), dates
+                   in sorted(self.required.items())
+                   if self.price_data.data_sources[data_source.upper()].breaker.state() ==
+                   CircuitBreaker.OPEN]
+        if failing:
+            plan = PricePlan(self.price_data)
+            for _, pair, dates in failing:
+                asset, quote = pair.split('/')
+                for timestamp in dates.values():
+                    plan.add(asset, quote, timestamp)
+
+            if plan.plan():
+                plan.prefetch()
+
+    def output(self):
+        print("%sprice plan:" % Fore.WHITE)
+        for key in sorted(set(self.required) | set(self.cached)):
+            data_source, pair = key
+            required = sorted(self.required.get(key, {}))
+            cached = sorted(self.cached.get(key, set()))
+            requests = len([r for r in self.requests
+                            if r[0].name() == data_source and r[0].pair(r[1], r[2]) == pair])
+
+            print("%s%s (%s) %sdates=%d, cached=%d%s, requests=%d" % (
+                Fore.YELLOW, data_source, pair, Fore.WHITE,
+                len(required) + len(cached), len(cached),
+                ' (%s to %s)' % (cached[0], cached[-1]) if cached else '',
+                requests))
+
+            if config.args.debug:
+                for date in cached:
+                    print("%splan:   %s cached" % (Fore.GREEN, date))
+                for date in required:
+                    print("%splan:   %s" % (Fore.BLUE, date))
+
+        for asset in sorted(self.unavailable):
+            print("%s%s %sno data source" % (Fore.YELLOW, asset, Fore.WHITE))
+
+        for asset in sorted(self.missing):
+            print("%s%s %sno price (cached as missing)" % (Fore.YELLOW, asset, Fore.WHITE))
+
+        print("%sprice plan: dates=%d, cached=%d, requests=%d" % (
+            Fore.CYAN,
+            sum(len(dates) for dates in self.required.values()) +
+            sum(len(dates) for dates in self.cached.values()),
+            sum(len(dates) for dates in self.cached.values()),
+            len(self.requests)))
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+from collections import OrderedDict
+
+from ..config import config
+
+class PriceResolver(object):
+    MAX_SIZE = 100000
+
+    def __init__(self, price_data, max_size=MAX_SIZE):
+        self.price_data = price_data
+        self.max_size = max_size
+        self.resolved = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_historical(self, asset, quote, timestamp):
+        # The same asset is usually valued many times on the same day, so the data source
+        #  priority and price cache only need to be searched the first time, the price field
+        #  can be changed between scenarios
+        key = (asset, quote, timestamp.date(), config.data_source_time)
+        if key in self.resolved:
+            self.hits += 1
+            self.resolved.move_to_end(key)
+            return self.resolved[key], True
+
+        self.misses += 1
+        self.resolved[key] = self.price_data.get_historical(asset, quote, timestamp)
+        if len(self.resolved) > self.max_size:
+            self.resolved.popitem(last=False)
+        return self.resolved[key], False
+
+    def requests(self):
+        return sum(ds.requests for ds in self.price_data.data_sources.instances.values())
+
+    def __str__(self):
+        return "%s hits, %s misses, %s requests" % (
+            '{:,}'.format(self.hits),
+            '{:,}'.format(self.misses),
+            '{:,}'.format(self.requests()))
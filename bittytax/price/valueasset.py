@@ -9,14 +9,18 @@ from tqdm import tqdm
 
 from ..version import __version__
 from ..config import config
-from ..tax import which_tax_year
+from ..taxcalendar import get_tax_calendar
 from .pricedata import PriceData
+from .priceplan import PricePlan
+from .priceresolver import PriceResolver
 
 class ValueAsset(object):
     def __init__(self, price_tool=False):
         self.price_tool = price_tool
         self.price_data = PriceData(price_tool)
+        self.resolver = PriceResolver(self.price_data)
         self.price_report = {}
+        self.calendar = get_tax_calendar()
 
     def get_value(self, asset, timestamp, quantity):
         if asset == config.CCY or asset in config.force_fiat_list and config.force_fiat_list[asset] == config.CCY:
@@ -48,6 +52,34 @@ class ValueAsset(object):
                 asset, timestamp.strftime('%Y-%m-%d'), config.sym() + '{:0,.2f}'.format(0)))
             return Decimal(0), False
 
+    def get_price_plan(self, transactions):
+        # Plan the historic prices needed to value the transactions, as get_value() would
+        plan = PricePlan(self.price_data)
+        for t in transactions:
+            if t.asset == config.CCY or t.asset in config.force_fiat_list and \
+                    config.force_fiat_list[t.asset] == config.CCY:
+                continue
+
+            if not t.quantity or t.timestamp.date() >= datetime.now().date():
+                continue
+
+            plan.add(t.asset, config.CCY, t.timestamp)
+
+        plan.plan()
+        return plan
+
+    def prefetch_latest(self, assets, target_asset=config.CCY):
+        # Fetch the latest prices needed by get_latest_price() together
+        pairs = set()
+        for asset in assets:
+            if asset == 'BTC' or asset in config.fiat_list:
+                pairs.add((asset, target_asset))
+            else:
+                pairs.add((asset, 'BTC'))
+                pairs.add(('BTC', target_asset))
+
+        self.price_data.prefetch_latest(pairs)
+
     def get_current_value(self, asset, quantity):
         asset_price_ccy, name, data_source = self.get_latest_price(asset)
         if asset_price_ccy is not None:
@@ -64,10 +96,10 @@ class ValueAsset(object):
                                                asset, timestamp.strftime('%Y-%m-%d')))
             return self.get_latest_price(asset)
 
-        asset_price_ccy, name, data_source, url = self.price_data.get_historical(asset,
-                                                                                 target_symbol,
-                                                                                 timestamp)
-        self.price_report_cache(asset, timestamp, name, data_source, url, asset_price_ccy)
+        (asset_price_ccy, name, data_source, url), resolved = self.resolver.get_historical(
+            asset, target_symbol, timestamp)
+        if not resolved:
+            self.price_report_cache(asset, timestamp, name, data_source, url, asset_price_ccy)
 
         # if asset == 'BTC' or asset in config.fiat_list:
         #     asset_price_ccy, name, data_source, url = self.price_data.get_historical(asset,
@@ -108,7 +140,7 @@ class ValueAsset(object):
 
     def price_report_cache(self, asset, timestamp, name, data_source, url,
                            price_ccy, price_btc=None):
-        tax_year = which_tax_year(timestamp)
+        tax_year = self.calendar.tax_year(timestamp)
 
         if tax_year not in self.price_report:
             self.price_report[tax_year] = {}
@@ -4,6 +4,8 @@
 from .config import config
 
 class TransactionRecord(object):
+    __slots__ = ('tid', 't_type', 'buy', 'sell', 'fee', 'wallet', 'timestamp', 'note')
+
     TYPE_DEPOSIT = 'Deposit'
     TYPE_MINING = 'Mining'
     TYPE_STAKING = 'Staking'
@@ -15,6 +15,7 @@ import dateutil.parser
 
 from .version import __version__
 from .config import config
+from .taxcalendar import TaxCalendar
 
 class ReportPdf(object):
     DEFAULT_FILENAME = 'BittyTax_Report'
@@ -29,6 +30,7 @@ class ReportPdf(object):
         self.env.filters['quantityfilter'] = self.quantityfilter
         self.env.filters['valuefilter'] = self.valuefilter
         self.env.filters['nowrapfilter'] = self.nowrapfilter
+        self.env.filters['taxyearfilter'] = TaxCalendar.label
 
         template = self.env.get_template(self.TEMPLATE_FILE)
         html = template.render({'date': datetime.now(),
@@ -106,8 +108,8 @@ class ReportLog(object):
             if not config.args.summary:
                 self.audit()
 
-            print("\n%sTax Year - %d/%d%s%s" % (
-                Back.WHITE+Fore.BLACK, config.args.taxyear - 1, config.args.taxyear, ' ' * 70, Back.RESET))
+            print("\n%sTax Year - %s%s%s" % (
+                Back.WHITE+Fore.BLACK, TaxCalendar.label(config.args.taxyear), ' ' * 70, Back.RESET))
             self.capital_gains(config.args.taxyear)
             if not config.args.summary:
                 self.income(config.args.taxyear)
@@ -119,8 +121,8 @@ class ReportLog(object):
                 self.audit()
 
             for tax_year in sorted(tax_report):
-                print("\n%sTax Year - %d/%d%s%s" % (
-                    Back.WHITE+Fore.BLACK, tax_year - 1, tax_year, ' ' * 70, Back.RESET))
+                print("\n%sTax Year - %s%s%s" % (
+                    Back.WHITE+Fore.BLACK, TaxCalendar.label(tax_year), ' ' * 70, Back.RESET))
                 self.capital_gains(tax_year)
                 if not config.args.summary:
                     self.income(tax_year)
@@ -361,7 +363,7 @@ class ReportLog(object):
             Style.NORMAL))
 
     def price_data(self, tax_year):
-        print("%sPrice Data - %d/%d\n" % (Fore.CYAN, tax_year - 1, tax_year))
+        print("%sPrice Data - %s\n" % (Fore.CYAN, TaxCalendar.label(tax_year)))
         print("%s%s %-16s %-10s  %13s %25s" % (
             Fore.YELLOW,
             'Asset'.ljust(self.ASSET_WIDTH+2),
@@ -463,6 +465,51 @@ class ReportLog(object):
             return "%s (%s)" % (asset, name)
         return asset
 
+class ReportScenarios(object):
+    ROWS = (('disposals', "Number of disposals:"),
+            ('proceeds', "Disposal proceeds:"),
+            ('costs', "Allowable costs:"),
+            ('total_gain', "Gains before losses:"),
+            ('total_loss', "Losses:"),
+            ('gain', "Net gain:"),
+            ('taxable_gain', "Taxable gain:"),
+            ('income', "Income:"))
+    COLUMN_WIDTH = 16
+
+    def __init__(self, scenarios):
+        self.scenarios = scenarios
+
+        print("%sscenario report output:" % Fore.WHITE)
+        print("\n%sScenarios%s" % (Fore.CYAN+Style.BRIGHT, Style.NORMAL))
+        for scenario in self.scenarios.scenarios:
+            print("%s%s" % (Fore.WHITE, scenario))
+
+        for tax_year in self.scenarios.tax_years():
+            print("\n%sTax Year - %s%s%s" % (
+                Back.WHITE+Fore.BLACK, TaxCalendar.label(tax_year), ' ' * 70, Back.RESET))
+            self.comparison(tax_year)
+
+    def comparison(self, tax_year):
+        header = "%-25s" % '' + ''.join(' ' + scenario.name[:self.COLUMN_WIDTH].rjust(
+            self.COLUMN_WIDTH) for scenario in self.scenarios.scenarios)
+        print("%s%s" % (Fore.YELLOW, header))
+
+        for field, label in self.ROWS:
+            values = [results[tax_year][field] if tax_year in results else 0
+                      for results in self.scenarios.results]
+
+            # Values which differ from the config scenario are highlighted
+            print("%s%-25s%s" % (Fore.WHITE, label, ''.join(
+                "%s %s" % (Fore.YELLOW if value != values[0] else Fore.WHITE,
+                           self.format_value(field, value).rjust(self.COLUMN_WIDTH))
+                for value in values)))
+
+    @staticmethod
+    def format_value(field, value):
+        if field == 'disposals':
+            return '%d' % value
+        return ReportLog.format_value(value)
+
 class ProgressSpinner:
     def __init__(self):
         self.spinner = itertools.cycle(['-', '\\', '|', '/'])
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+import sys
+import copy
+import multiprocessing
+
+from colorama import Fore
+from tqdm import tqdm
+
+from .config import config
+from .transactions import TransactionHistory
+from .tax import TaxCalculator, CalculateCapitalGains, _init_worker
+
+# Scenarios (and their split transactions) being calculated in parallel, these are inherited by
+#  the forked worker processes
+_parallel_scenarios = None
+
+class TaxScenario(object):
+    # Scenario keys, and the config each one sets
+    KEYS = {'trade_asset_type': 'trade_asset_type',
+            'trade_allowable_cost_type': 'trade_allowable_cost_type',
+            'bnb': 'bed_and_breakfast_days',
+            'business': 'business_rules',
+            'time': 'data_source_time'}
+    SPLIT_SETTINGS = ('trade_asset_type', 'trade_allowable_cost_type', 'data_source_time')
+
+    def __init__(self, name, settings):
+        self.name = name
+        self.settings = settings
+        self.transactions = None
+
+    def apply(self, base):
+        for name, value in base.items():
+            setattr(config, name, value)
+
+        for name, value in self.settings.items():
+            setattr(config, name, value)
+
+        if 'business_rules' in self.settings and 'bed_and_breakfast_days' not in self.settings:
+            config.bed_and_breakfast_days = config.BNB_DAYS_BUSINESS if config.business_rules \
+                                            else config.BNB_DAYS_INDIVIDUAL
+
+    def split_key(self, base):
+        # Scenarios with the same key have the same transactions once split
+        return tuple(self.settings.get(name, base[name]) for name in self.SPLIT_SETTINGS)
+
+    def calculate(self):
+        tax = TaxCalculator(self.transactions)
+        tax.pool_same_day()
+        tax.match(tax.DISPOSAL_SAME_DAY)
+        tax.match(tax.DISPOSAL_BED_AND_BREAKFAST)
+        tax.process_section104()
+        tax.process_income()
+
+        results = {}
+        for tax_year in tax.tax_years():
+            if tax_year not in CalculateCapitalGains.CG_DATA_INDIVIDUALS or \
+                    config.args.taxyear and tax_year != config.args.taxyear:
+                continue
+
+            tax.calculate_capital_gains(tax_year)
+            tax.calculate_income(tax_year)
+            cgains = tax.tax_report[tax_year]['CapitalGains']
+            results[tax_year] = {'disposals': cgains.summary['disposals'],
+                                 'proceeds': cgains.totals['proceeds'],
+                                 'costs': cgains.totals['cost'] + cgains.totals['fees'],
+                                 'total_gain': cgains.summary['total_gain'],
+                                 'total_loss': abs(cgains.summary['total_loss']),
+                                 'gain': cgains.totals['gain'],
+                                 'taxable_gain': cgains.estimate['taxable_gain'],
+                                 'income': tax.tax_report[tax_year]['Income'].totals['amount']}
+        return results
+
+    def __str__(self):
+        if not self.settings:
+            return "%s (config)" % self.name
+
+        names = {v: k for k, v in self.KEYS.items()}
+        return "%s (%s)" % (self.name, ', '.join('%s=%s' % (names[name], value
+                                                             if isinstance(value, str)
+                                                             else int(value))
+                                                 for name, value in self.settings.items()))
+
+class TaxScenarios(object):
+    SETTINGS = ('trade_asset_type', 'trade_allowable_cost_type', 'bed_and_breakfast_days',
+                'business_rules', 'data_source_time')
+
+    def __init__(self, scenarios, transaction_records, value_asset):
+        # The config as given is always the first scenario
+        self.scenarios = [TaxScenario('config', {})] + scenarios
+        self.base = {name: getattr(config, name) for name in self.SETTINGS}
+        self.results = []
+
+        # Records are only split (and valued) once for each distinct trade setting, prices are
+        #  then served from the price data already loaded
+        splits = {}
+        for scenario in self.scenarios:
+            key = scenario.split_key(self.base)
+            if key not in splits:
+                if config.args.debug:
+                    print("%sscenario: split transaction records for %s" % (
+                        Fore.CYAN, scenario))
+
+                scenario.apply(self.base)
+                splits[key] = TransactionHistory(self.copy_records(transaction_records),
+                                                 value_asset).transactions
+            scenario.transactions = splits[key]
+
+        self.restore()
+
+    @staticmethod
+    def copy_records(transaction_records):
+        # Splitting updates the records with their values, so each split has its own copy
+        records = []
+        for tr in transaction_records:
+            tr = copy.copy(tr)
+            tr.tid = None
+            for name in ('buy', 'sell', 'fee'):
+                t = getattr(tr, name)
+                if t:
+                    t = copy.copy(t)
+                    t.t_record = tr
+                    t.pooled = []
+                    setattr(tr, name, t)
+            records.append(tr)
+        return records
+
+    def calculate(self, jobs):
+        global _parallel_scenarios
+
+        if jobs > 1 and not config.args.debug:
+            _parallel_scenarios = self
+            try:
+                pool = multiprocessing.get_context('fork').Pool(min(jobs, len(self.scenarios)),
+                                                                initializer=_init_worker)
+                try:
+                    self.results = list(tqdm(pool.imap(_calculate_scenario,
+                                                       range(len(self.scenarios))),
+                                             total=len(self.scenarios),
+                                             unit='s',
+                                             desc="%scalculate scenarios%s" % (
+                                                 Fore.CYAN, Fore.GREEN),
+                                             disable=not sys.stdout.isatty()))
+                finally:
+                    pool.terminate()
+            finally:
+                _parallel_scenarios = None
+        else:
+            for scenario in self.scenarios:
+                if config.args.debug:
+                    print("%sscenario: calculate %s" % (Fore.CYAN, scenario))
+
+                scenario.apply(self.base)
+                self.results.append(scenario.calculate())
+
+        self.restore()
+
+    def restore(self):
+        for name, value in self.base.items():
+            setattr(config, name, value)
+
+    def tax_years(self):
+        return sorted(set(tax_year for results in self.results for tax_year in results))
+
+def _calculate_scenario(i):
+    scenario = _parallel_scenarios.scenarios[i]
+    scenario.apply(_parallel_scenarios.base)
+    return scenario.calculate()
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+import os
+import json
+import hashlib
+from decimal import Decimal
+from datetime import timedelta
+
+from colorama import Fore, Back
+import dateutil.parser
+
+from .version import __version__
+from .config import config
+from .transactions import Buy
+from .holdings import Holdings
+from .tax import which_tax_year, TaxEventCapitalGains
+from .taxcalendar import get_tax_calendar
+
+class TaxSnapshots(object):
+    HOLDINGS_FIELDS = ('quantity', 'cost', 'fees', 'withdrawals', 'deposits', 'mismatches')
+    TAX_EVENT_FIELDS = ('disposal_type', 'asset', 'quantity', 'cost', 'fees', 'proceeds', 'gain')
+
+    def __init__(self, filename, transactions):
+        self.filename = filename
+        self.boundaries = self.get_boundaries(transactions)
+        self.fingerprints = self.get_fingerprints(transactions)
+        self.snapshots = self.load_snapshots()
+        self.holdings = [{} for _ in self.boundaries]
+        self.recorded = {}
+
+        # Latest tax year boundary where it, and every boundary before it, have a snapshot
+        #  which matches the transactions
+        self.restored = -1
+        for fingerprint in self.fingerprints:
+            if fingerprint not in self.snapshots:
+                break
+            self.restored += 1
+
+        if config.args.debug:
+            for i, boundary in enumerate(self.boundaries):
+                print("%ssnapshot: %s %s%s" % (
+                    Fore.CYAN,
+                    boundary.strftime('%Y-%m-%d'),
+                    self.fingerprints[i],
+                    ' (restored)' if i == self.restored else ''))
+
+    @staticmethod
+    def get_boundaries(transactions):
+        # Start of each tax year, which falls within the transactions
+        if not transactions:
+            return []
+
+        return get_tax_calendar().boundaries(min(t.timestamp for t in transactions),
+                                             max(t.timestamp for t in transactions))
+
+    def get_fingerprints(self, transactions):
+        # A snapshot depends upon every transaction up until the end of the bed and breakfast
+        #  window after the boundary, and also the config used by the tax calculation
+        sha = hashlib.sha1(repr((__version__,
+                                 config.business_rules,
+                                 config.bed_and_breakfast_days,
+                                 config.transfers_include,
+                                 config.tax_year_start_day,
+                                 config.tax_year_start_month,
+                                 config.tax_year_first_year,
+                                 bool(config.args.skip_integrity))).encode('utf-8'))
+        fingerprints = []
+
+        for t in sorted(transactions, key=lambda t: t.timestamp):
+            while len(fingerprints) < len(self.boundaries) and \
+                    t.timestamp >= self._window_end(len(fingerprints)):
+                fingerprints.append(self._fingerprint(sha, len(fingerprints)))
+
+            sha.update(self._transaction_key(t).encode('utf-8'))
+
+        while len(fingerprints) < len(self.boundaries):
+            fingerprints.append(self._fingerprint(sha, len(fingerprints)))
+
+        return fingerprints
+
+    def _window_end(self, i):
+        return self.boundaries[i] + timedelta(days=config.bed_and_breakfast_days)
+
+    def _fingerprint(self, sha, i):
+        return hashlib.sha1((sha.hexdigest() +
+                             self.boundaries[i].isoformat()).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _transaction_key(t):
+        if isinstance(t, Buy):
+            value, taxable = t.cost, t.acquisition
+        else:
+            value, taxable = t.proceeds, t.disposal
+
+        return repr((type(t).__name__,
+                     t.t_type,
+                     t.asset,
+                     str(t.quantity),
+                     str(value),
+                     str(t.fee_value),
+                     taxable,
+                     t.timestamp.isoformat(),
+                     t.wallet,
+                     t.note))
+
+    def load_snapshots(self):
+        if not os.path.exists(self.filename):
+            return {}
+
+        try:
+            with open(self.filename, 'r') as snapshot_file:
+                return json.load(snapshot_file)
+        except:
+            print("%sWARNING%s Tax snapshots could not be loaded: %s" % (
+                Back.YELLOW+Fore.BLACK, Back.RESET+Fore.YELLOW, self.filename))
+            return {}
+
+    def dump_snapshots(self, tax_events):
+        snapshots = {}
+        for i, fingerprint in enumerate(self.fingerprints):
+            if i <= self.restored:
+                snapshots[fingerprint] = self.snapshots[fingerprint]
+                continue
+
+            start_year = which_tax_year(self.boundaries[i-1]) if i else None
+            end_year = which_tax_year(self.boundaries[i])
+            snapshots[fingerprint] = {
+                'boundary': self.boundaries[i].isoformat(),
+                'holdings': self.holdings[i],
+                'tax_events': {str(tax_year): [self.encode_tax_event(te)
+                                               for te in tax_events[tax_year]]
+                               for tax_year in tax_events
+                               if (start_year is None or tax_year >= start_year) and
+                               tax_year < end_year},
+                'carried': [self.encode_tax_event(te)
+                            for tax_year in sorted(tax_events)
+                            for te in tax_events[tax_year]
+                            if self._is_carried(te, self.boundaries[i])]}
+
+        with open(self.filename, 'w') as snapshot_file:
+            json.dump(snapshots, snapshot_file, sort_keys=True)
+
+    @staticmethod
+    def _is_carried(te, boundary):
+        # Bed and breakfast match between a lot before the boundary and a lot after it
+        if te.acquisition_date is None:
+            return False
+
+        if config.business_rules:
+            return te.acquisition_date < boundary <= te.date
+        return te.date < boundary <= te.acquisition_date
+
+    def record_holdings(self, holdings, asset, timestamp=None):
+        # Record the section 104 pool for each boundary passed, no timestamp is given when the
+        #  asset has no further transactions
+        i = self.recorded.get(asset, self.restored + 1)
+        while i < len(self.boundaries) and (timestamp is None or timestamp >= self.boundaries[i]):
+            if asset in holdings:
+                self.holdings[i][asset] = [str(getattr(holdings[asset], field))
+                                           for field in self.HOLDINGS_FIELDS]
+            i += 1
+
+        self.recorded[asset] = i
+
+    def get_recorded(self, asset):
+        return [holdings.get(asset) for holdings in self.holdings]
+
+    def set_recorded(self, asset, recorded):
+        for i, holdings in enumerate(recorded):
+            if holdings is not None:
+                self.holdings[i][asset] = holdings
+
+    def get_holdings(self):
+        holdings = {}
+        snapshot = self.snapshots[self.fingerprints[self.restored]]
+        for asset in sorted(snapshot['holdings']):
+            holdings[asset] = Holdings(asset)
+            for field, value in zip(self.HOLDINGS_FIELDS, snapshot['holdings'][asset]):
+                if field in ('quantity', 'cost', 'fees'):
+                    setattr(holdings[asset], field, Decimal(value))
+                else:
+                    setattr(holdings[asset], field, int(value))
+        return holdings
+
+    def get_tax_events(self):
+        tax_events = {}
+        for fingerprint in self.fingerprints[:self.restored + 1]:
+            snapshot = self.snapshots[fingerprint]
+            for tax_year in snapshot['tax_events']:
+                tax_events[int(tax_year)] = [self.decode_tax_event(te)
+                                             for te in snapshot['tax_events'][tax_year]]
+        return tax_events
+
+    def get_carried(self):
+        snapshot = self.snapshots[self.fingerprints[self.restored]]
+        return [self.decode_tax_event(te) for te in snapshot['carried']]
+
+    def encode_tax_event(self, te):
+        json_te = {field: str(getattr(te, field)) for field in self.TAX_EVENT_FIELDS}
+        json_te['date'] = te.date.isoformat()
+        json_te['acquisition_date'] = te.acquisition_date.isoformat() \
+                                      if te.acquisition_date else None
+        return json_te
+
+    def decode_tax_event(self, json_te):
+        te = TaxEventCapitalGains.__new__(TaxEventCapitalGains)
+        te.disposal_type = json_te['disposal_type']
+        te.asset = json_te['asset']
+        for field in ('quantity', 'cost', 'fees', 'proceeds', 'gain'):
+            setattr(te, field, Decimal(json_te[field]))
+
+        te.date = self.str_to_datetime(json_te['date'])
+        te.acquisition_date = self.str_to_datetime(json_te['acquisition_date'])
+        return te
+
+    @staticmethod
+    def str_to_datetime(timestamp):
+        if timestamp:
+            return dateutil.parser.isoparse(timestamp).astimezone(config.TZ_LOCAL)
+
+        return None
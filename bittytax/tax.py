@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 # (c) Nano Nano Ltd 2019
 
+import os
 import sys
 import copy
+import bisect
+import multiprocessing
 from decimal import Decimal
-from datetime import datetime, timedelta
+from datetime import timedelta
 
 from colorama import Fore
 from tqdm import tqdm
@@ -12,21 +15,17 @@ from tqdm import tqdm
 from .config import config
 from .transactions import Buy, Sell
 from .holdings import Holdings
+from .taxcalendar import get_tax_calendar
 
 PRECISION = Decimal('0.00')
 
+# Calculator (and its transactions by asset) being processed in parallel, these are inherited
+#  by the forked worker processes
+_parallel_tax = None
+_parallel_assets = None
+
 def which_tax_year(timestamp):
-    if config.tax_year_first_year > 0 and timestamp < datetime(config.tax_year_first_year,
-                                                               config.tax_year_start_month,
-                                                               config.tax_year_start_day,
-                                                               tzinfo=config.TZ_LOCAL):
-        tax_year = config.tax_year_first_year
-    elif timestamp >= datetime(timestamp.year, config.tax_year_start_month, config.tax_year_start_day, tzinfo=config.TZ_LOCAL):
-        tax_year = timestamp.year + 1
-    else:
-        tax_year = timestamp.year
-
-    return tax_year
+    return get_tax_calendar().tax_year(timestamp)
 
 class TaxCalculator(object):
     DISPOSAL_SAME_DAY = 'Same Day'
@@ -36,45 +35,128 @@ class TaxCalculator(object):
 
     TRANSFER_TYPES = (Buy.TYPE_DEPOSIT, Sell.TYPE_WITHDRAWAL)
 
+    PARALLEL_PHASES = (DISPOSAL_SAME_DAY, DISPOSAL_BED_AND_BREAKFAST, DISPOSAL_SECTION_104)
+
     INCOME_TYPES = (Buy.TYPE_MINING, Buy.TYPE_STAKING, Buy.TYPE_DIVIDEND, Buy.TYPE_INTEREST,
                     Buy.TYPE_INCOME)
 
-    def __init__(self, transactions):
+    def __init__(self, transactions, snapshots=None):
         self.transactions = transactions
         self.buys_ordered = []
         self.sells_ordered = []
         self.other_transactions = []
 
+        # Tax events by tax year, capital gains and income are kept apart
         self.tax_events = {}
+        self.income_events = {}
         self.holdings = {}
 
+        self.snapshots = snapshots
+        self.calendar = get_tax_calendar()
+        self.start = None
+        self.carried = []
+
         self.tax_report = {}
         self.holdings_report = {}
 
+    def restore_snapshot(self):
+        if self.snapshots.restored < 0:
+            return
+
+        self.start = self.snapshots.boundaries[self.snapshots.restored]
+        self.tax_events = self.snapshots.get_tax_events()
+        self.holdings = self.snapshots.get_holdings()
+        self.carried = self.snapshots.get_carried()
+
+        print("%ssnapshot restored, recalculating from tax year %s" % (
+            Fore.CYAN, self.calendar.label(self.calendar.tax_year(self.start))))
+
+    def process_parallel(self, jobs):
+        # Each asset is pooled, matched and added to its section 104 pool independently, only
+        #  the resulting tax events and holdings are merged, in the same order as if processed
+        #  sequentially
+        global _parallel_tax, _parallel_assets
+
+        if config.args.debug:
+            print("%sprocess assets in parallel (jobs=%d)" % (Fore.CYAN, jobs))
+
+        assets = {}
+        for t in self.transactions:
+            if t.asset not in assets:
+                assets[t.asset] = []
+            assets[t.asset].append(t)
+
+        for asset in list(self.holdings) + [te.asset for te in self.carried]:
+            if asset not in assets:
+                assets[asset] = []
+
+        _parallel_tax = self
+        _parallel_assets = assets
+
+        results = {}
+        try:
+            pool = multiprocessing.get_context('fork').Pool(min(jobs, len(assets) or 1),
+                                                            initializer=_init_worker)
+            try:
+                # Largest assets first, so the pool isn't waiting on one at the end
+                for asset, result in tqdm(pool.imap_unordered(_process_asset,
+                                                              sorted(assets,
+                                                                     key=lambda a: len(assets[a]),
+                                                                     reverse=True)),
+                                          total=len(assets),
+                                          unit='a',
+                                          desc="%sprocess assets%s" % (Fore.CYAN, Fore.GREEN),
+                                          disable=bool(config.args.debug or
+                                                       not sys.stdout.isatty())):
+                    results[asset] = result
+            finally:
+                pool.terminate()
+        finally:
+            _parallel_tax = _parallel_assets = None
+
+        for phase in range(len(self.PARALLEL_PHASES)):
+            for asset in sorted(results):
+                tax_events = results[asset][0][phase]
+                for tax_year in tax_events:
+                    if tax_year not in self.tax_events:
+                        self.tax_events[tax_year] = []
+                    self.tax_events[tax_year].extend(tax_events[tax_year])
+
+        for asset in sorted(results):
+            _, holdings, recorded = results[asset]
+            self.holdings.update(holdings)
+            if self.snapshots:
+                self.snapshots.set_recorded(asset, recorded)
+
     def pool_same_day(self):
-        transactions = copy.deepcopy(self.transactions)
         buy_transactions = {}
         sell_transactions = {}
 
         if config.args.debug:
             print("%spool same day transactions" % Fore.CYAN)
 
-        for t in tqdm(transactions,
+        # The original transactions are left unchanged, only shallow copies are updated. Pooled
+        #  transactions just keep a reference to the originals.
+        for t in tqdm(self.transactions,
                       unit='t',
                       desc="%spool same day%s" % (Fore.CYAN, Fore.GREEN),
                       disable=bool(config.args.debug or not sys.stdout.isatty())):
+            if self.start and t.timestamp < self.start:
+                # Already included in the snapshot
+                continue
+
             if isinstance(t, Buy) and t.acquisition:
                 if (t.asset, t.timestamp.date()) not in buy_transactions:
-                    buy_transactions[(t.asset, t.timestamp.date())] = t
+                    buy_transactions[(t.asset, t.timestamp.date())] = copy.copy(t)
                 else:
                     buy_transactions[(t.asset, t.timestamp.date())] += t
             elif isinstance(t, Sell) and t.disposal and t.t_type != t.TYPE_GIFT_SPOUSE:
                 if (t.asset, t.timestamp.date()) not in sell_transactions:
-                    sell_transactions[(t.asset, t.timestamp.date())] = t
+                    sell_transactions[(t.asset, t.timestamp.date())] = copy.copy(t)
                 else:
                     sell_transactions[(t.asset, t.timestamp.date())] += t
             else:
-                self.other_transactions.append(t)
+                self.other_transactions.append(copy.copy(t))
 
         self.buys_ordered = sorted(buy_transactions.values())
         self.sells_ordered = sorted(sell_transactions.values())
@@ -90,11 +172,49 @@ class TaxCalculator(object):
             print("%spool: total transactions=%d" % (Fore.CYAN, len(self.all_transactions())))
 
     def match(self, rule):
+        if rule == self.DISPOSAL_BED_AND_BREAKFAST and self.carried:
+            self.match_carried()
+
         return self.match_business(rule) if config.business_rules else self.match_individual(rule)
 
-    def match_individual(self, rule):
-        sell_index = buy_index = 0
+    def match_carried(self):
+        # Lots already matched with lots from before the snapshot, the same splits are repeated
+        #  so the lots are left exactly as they would be without the snapshot
+        if config.args.debug:
+            print("%smatch snapshot transactions" % Fore.CYAN)
+
+        if config.business_rules:
+            lots_index = self._index_lots(self.sells_ordered)
+        else:
+            lots_index = self._index_lots(self.buys_ordered)
+
+        remainders = {}
+        for te in self.carried:
+            if config.business_rules:
+                candidates = lots_index[te.asset][1][te.date.date()]
+            else:
+                candidates = lots_index[te.asset][1][te.acquisition_date.date()]
+
+            t = candidates[0]
+            if t.quantity > te.quantity:
+                if isinstance(t, Buy):
+                    remainders[id(t)] = candidates[0] = t.split_buy(te.quantity)
+                else:
+                    remainders[id(t)] = candidates[0] = t.split_sell(te.quantity)
+            else:
+                del candidates[0]
+
+            t.matched = True
+            if config.args.debug:
+                print("%smatch: %s <- snapshot" % (Fore.GREEN, t.__str__(quantity_bold=True)))
+                print("%smatch:   %s" % (Fore.CYAN, te))
+
+        if config.business_rules:
+            self.sells_ordered = self._insert_remainders(self.sells_ordered, remainders)
+        else:
+            self.buys_ordered = self._insert_remainders(self.buys_ordered, remainders)
 
+    def match_individual(self, rule):
         if not self.buys_ordered:
             return
 
@@ -106,12 +226,22 @@ class TaxCalculator(object):
                     desc="%smatch %s transactions%s" % (Fore.CYAN, rule.lower(), Fore.GREEN),
                     disable=bool(config.args.debug or not sys.stdout.isatty()))
 
-        while sell_index < len(self.sells_ordered):
-            s = self.sells_ordered[sell_index]
-            b = self.buys_ordered[buy_index]
+        buys_index = self._index_lots(self.buys_ordered)
+        buy_remainders = {}
+        sell_remainders = {}
+
+        for s in self.sells_ordered:
+            while s is not None:
+                candidates = None
+                if not s.matched:
+                    candidates = self._match_candidates(buys_index, s, rule)
 
-            if (not s.matched and not b.matched and s.asset == b.asset and
-                    self._rule_match(s.timestamp, b.timestamp, rule)):
+                if not candidates:
+                    # Find next sell
+                    pbar.update(1)
+                    break
+
+                b = candidates[0]
                 if config.args.debug:
                     if b.quantity > s.quantity:
                         print("%smatch: %s" % (Fore.GREEN, s.__str__(quantity_bold=True)))
@@ -123,19 +253,23 @@ class TaxCalculator(object):
                         print("%smatch: %s" % (Fore.GREEN, s.__str__(quantity_bold=True)))
                         print("%smatch: %s" % (Fore.GREEN, b.__str__(quantity_bold=True)))
 
+                s_remainder = None
                 if b.quantity > s.quantity:
                     b_remainder = b.split_buy(s.quantity)
-                    self.buys_ordered.insert(buy_index + 1, b_remainder)
+                    buy_remainders[id(b)] = candidates[0] = b_remainder
                     if config.args.debug:
                         print("%smatch:   split: %s" % (Fore.YELLOW, b.__str__(quantity_bold=True)))
                         print("%smatch:   split: %s" % (Fore.YELLOW, b_remainder))
-                elif s.quantity > b.quantity:
-                    s_remainder = s.split_sell(b.quantity)
-                    self.sells_ordered.insert(sell_index + 1, s_remainder)
-                    if config.args.debug:
-                        print("%smatch:   split: %s" % (Fore.YELLOW, s.__str__(quantity_bold=True)))
-                        print("%smatch:   split: %s" % (Fore.YELLOW, s_remainder))
-                    pbar.total += 1
+                else:
+                    del candidates[0]
+                    if s.quantity > b.quantity:
+                        s_remainder = s.split_sell(b.quantity)
+                        sell_remainders[id(s)] = s_remainder
+                        if config.args.debug:
+                            print("%smatch:   split: %s" % (Fore.YELLOW,
+                                                            s.__str__(quantity_bold=True)))
+                            print("%smatch:   split: %s" % (Fore.YELLOW, s_remainder))
+                        pbar.total += 1
 
                 s.matched = b.matched = True
                 tax_event = TaxEventCapitalGains(rule, b, s, b.cost,
@@ -145,25 +279,19 @@ class TaxCalculator(object):
                 if config.args.debug:
                     print("%smatch:   %s" % (Fore.CYAN, tax_event))
 
-                # Find next sell
-                sell_index += 1
+                # Any remainder of the sell is matched next
                 pbar.update(1)
-                buy_index = 0
-            else:
-                buy_index += 1
-                if buy_index >= len(self.buys_ordered):
-                    sell_index += 1
-                    pbar.update(1)
-                    buy_index = 0
+                s = s_remainder
 
         pbar.close()
 
+        self.buys_ordered = self._insert_remainders(self.buys_ordered, buy_remainders)
+        self.sells_ordered = self._insert_remainders(self.sells_ordered, sell_remainders)
+
         if config.args.debug:
             print("%smatch: total transactions=%d" % (Fore.CYAN, len(self.all_transactions())))
 
     def match_business(self, rule):
-        sell_index = buy_index = 0
-
         if not self.sells_ordered:
             return
 
@@ -175,12 +303,31 @@ class TaxCalculator(object):
                     desc="%smatch %s transactions%s" % (Fore.CYAN, rule.lower(), Fore.GREEN),
                     disable=bool(config.args.debug or not sys.stdout.isatty()))
 
-        while buy_index < len(self.buys_ordered):
-            s = self.sells_ordered[sell_index]
-            b = self.buys_ordered[buy_index]
+        sells_index = self._index_lots(self.sells_ordered)
+        buy_remainders = {}
+        sell_remainders = {}
+
+        # Tax events carried from the snapshot are after it so weren't restored, they are added
+        #  in the same order as if their buys had been matched
+        carried = self.carried if rule == self.DISPOSAL_BED_AND_BREAKFAST else []
+        c = 0
 
-            if (not s.matched and not b.matched and s.asset == b.asset and
-                    self._rule_match(b.timestamp, s.timestamp, rule)):
+        for b in self.buys_ordered:
+            while c < len(carried) and carried[c].asset <= b.asset:
+                self.tax_events[self._which_tax_year(carried[c].date)].append(carried[c])
+                c += 1
+
+            while b is not None:
+                candidates = None
+                if not b.matched:
+                    candidates = self._match_candidates(sells_index, b, rule)
+
+                if not candidates:
+                    # Find next buy
+                    pbar.update(1)
+                    break
+
+                s = candidates[0]
                 if config.args.debug:
                     if s.quantity > b.quantity:
                         print("%smatch: %s" % (Fore.GREEN, b.__str__(quantity_bold=True)))
@@ -192,19 +339,23 @@ class TaxCalculator(object):
                         print("%smatch: %s" % (Fore.GREEN, b.__str__(quantity_bold=True)))
                         print("%smatch: %s" % (Fore.GREEN, s.__str__(quantity_bold=True)))
 
+                b_remainder = None
                 if s.quantity > b.quantity:
                     s_remainder = s.split_sell(b.quantity)
-                    self.sells_ordered.insert(sell_index + 1, s_remainder)
+                    sell_remainders[id(s)] = candidates[0] = s_remainder
                     if config.args.debug:
                         print("%smatch:   split: %s" % (Fore.YELLOW, s.__str__(quantity_bold=True)))
                         print("%smatch:   split: %s" % (Fore.YELLOW, s_remainder))
-                elif b.quantity > s.quantity:
-                    b_remainder = b.split_buy(s.quantity)
-                    self.buys_ordered.insert(buy_index + 1, b_remainder)
-                    if config.args.debug:
-                        print("%smatch:   split: %s" % (Fore.YELLOW, b.__str__(quantity_bold=True)))
-                        print("%smatch:   split: %s" % (Fore.YELLOW, b_remainder))
-                    pbar.total += 1
+                else:
+                    del candidates[0]
+                    if b.quantity > s.quantity:
+                        b_remainder = b.split_buy(s.quantity)
+                        buy_remainders[id(b)] = b_remainder
+                        if config.args.debug:
+                            print("%smatch:   split: %s" % (Fore.YELLOW,
+                                                            b.__str__(quantity_bold=True)))
+                            print("%smatch:   split: %s" % (Fore.YELLOW, b_remainder))
+                        pbar.total += 1
 
                 s.matched = b.matched = True
                 tax_event = TaxEventCapitalGains(rule, b, s, b.cost,
@@ -214,32 +365,82 @@ class TaxCalculator(object):
                 if config.args.debug:
                     print("%smatch:   %s" % (Fore.CYAN, tax_event))
 
-                # Find next buy
-                buy_index += 1
+                # Any remainder of the buy is matched next
                 pbar.update(1)
-                sell_index = 0
-            else:
-                sell_index += 1
-                if sell_index >= len(self.sells_ordered):
-                    buy_index += 1
-                    pbar.update(1)
-                    sell_index = 0
+                b = b_remainder
+
+        for te in carried[c:]:
+            self.tax_events[self._which_tax_year(te.date)].append(te)
 
         pbar.close()
 
+        self.buys_ordered = self._insert_remainders(self.buys_ordered, buy_remainders)
+        self.sells_ordered = self._insert_remainders(self.sells_ordered, sell_remainders)
+
         if config.args.debug:
             print("%smatch: total transactions=%d" % (Fore.CYAN, len(self.all_transactions())))
 
-    def _rule_match(self, tx1_timestamp, tx2_timestamp, rule):
-        # for individuals: tx1,tx2 = sell,buy
-        # for businesses:  tx1,tx2 = buy,sell (bnb rules are different for businesses)
+    @staticmethod
+    def _index_lots(lots):
+        # Unmatched lots by asset, then by local date, dates are kept sorted for the bnb window
+        index = {}
+        for t in lots:
+            if t.matched:
+                continue
+
+            if t.asset not in index:
+                index[t.asset] = ([], {})
+
+            dates, lots_by_date = index[t.asset]
+            date = t.timestamp.date()
+            if date not in lots_by_date:
+                dates.append(date)
+                lots_by_date[date] = []
+
+            lots_by_date[date].append(t)
+
+        for dates, _ in index.values():
+            dates.sort()
+
+        return index
+
+    def _match_candidates(self, index, t, rule):
+        # for individuals: t is a sell, candidates are buys
+        # for businesses:  t is a buy, candidates are sells (bnb rules are different for businesses)
+        if t.asset not in index:
+            return None
+
+        dates, lots_by_date = index[t.asset]
+        date = t.timestamp.date()
+
         if rule == self.DISPOSAL_SAME_DAY:
-            return tx2_timestamp.date() == tx1_timestamp.date()
+            return lots_by_date.get(date)
         elif rule == self.DISPOSAL_BED_AND_BREAKFAST:
-            return tx1_timestamp.date() < tx2_timestamp.date() <= tx1_timestamp.date() + timedelta(days=config.bed_and_breakfast_days)
+            last_date = date + timedelta(days=config.bed_and_breakfast_days)
+            i = bisect.bisect_right(dates, date)
+            while i < len(dates) and dates[i] <= last_date:
+                if lots_by_date[dates[i]]:
+                    return lots_by_date[dates[i]]
+                i += 1
+            return None
         else:
             raise Exception
 
+    @staticmethod
+    def _insert_remainders(lots, remainders):
+        # Each remainder follows the lot it was split from
+        if not remainders:
+            return lots
+
+        lots_ordered = []
+        for t in lots:
+            lots_ordered.append(t)
+            while id(t) in remainders:
+                t = remainders[id(t)]
+                lots_ordered.append(t)
+
+        return lots_ordered
+
     def process_section104(self):
         if config.args.debug:
             print("%sprocess section 104" % Fore.CYAN)
@@ -248,6 +449,9 @@ class TaxCalculator(object):
                       unit='t',
                       desc="%sprocess section 104%s" % (Fore.CYAN, Fore.GREEN),
                       disable=bool(config.args.debug or not sys.stdout.isatty())):
+            if self.snapshots:
+                self.snapshots.record_holdings(self.holdings, t.asset, t.timestamp)
+
             if t.asset not in self.holdings:
                 self.holdings[t.asset] = Holdings(t.asset)
 
@@ -268,6 +472,10 @@ class TaxCalculator(object):
             elif isinstance(t, Sell):
                 self._subtract_tokens(t)
 
+        if self.snapshots:
+            for asset in self.holdings:
+                self.snapshots.record_holdings(self.holdings, asset)
+
     def _add_tokens(self, t):
         if not t.acquisition:
             cost = fees = Decimal(0)
@@ -322,7 +530,11 @@ class TaxCalculator(object):
                       disable=bool(config.args.debug or not sys.stdout.isatty())):
             if t.t_type in self.INCOME_TYPES:
                 tax_event = TaxEventIncome(t)
-                self.tax_events[self._which_tax_year(tax_event.date)].append(tax_event)
+                tax_year = self.calendar.tax_year(tax_event.date)
+                if tax_year not in self.income_events:
+                    self.income_events[tax_year] = []
+
+                self.income_events[tax_year].append(tax_event)
 
     def all_transactions(self):
         if not config.transfers_include:
@@ -330,24 +542,25 @@ class TaxCalculator(object):
             return self.other_transactions + self.buys_ordered + self.sells_ordered
         return self.buys_ordered + self.sells_ordered + self.other_transactions
 
+    def tax_years(self):
+        return sorted(set(self.tax_events) | set(self.income_events))
+
     def calculate_capital_gains(self, tax_year):
         self.tax_report[tax_year] = {}
         self.tax_report[tax_year]['CapitalGains'] = CalculateCapitalGains(tax_year)
 
         if tax_year in self.tax_events:
-            for te in sorted(self.tax_events[tax_year]):
-                if isinstance(te, TaxEventCapitalGains):
-                    self.tax_report[tax_year]['CapitalGains'].tax_summary(te)
+            for te in sorted(self.tax_events[tax_year], key=lambda te: te.date):
+                self.tax_report[tax_year]['CapitalGains'].tax_summary(te)
 
         self.tax_report[tax_year]['CapitalGains'].tax_estimate(tax_year)
 
     def calculate_income(self, tax_year):
         self.tax_report[tax_year]['Income'] = CalculateIncome()
 
-        if tax_year in self.tax_events:
-            for te in sorted(self.tax_events[tax_year]):
-                if isinstance(te, TaxEventIncome):
-                    self.tax_report[tax_year]['Income'].totalise(te)
+        if tax_year in self.income_events:
+            for te in sorted(self.income_events[tax_year], key=lambda te: te.date):
+                self.tax_report[tax_year]['Income'].totalise(te)
 
         self.tax_report[tax_year]['Income'].totals_by_type()
 
@@ -360,6 +573,10 @@ class TaxCalculator(object):
         if config.args.debug:
             print("%scalculating holdings" % Fore.CYAN)
 
+        value_asset.prefetch_latest({self.holdings[h].asset for h in self.holdings
+                                     if self.holdings[h].quantity > 0 or
+                                     config.show_empty_wallets})
+
         for h in tqdm(self.holdings,
                       unit='h',
                       desc="%scalculating holdings%s" % (Fore.CYAN, Fore.GREEN),
@@ -388,13 +605,41 @@ class TaxCalculator(object):
         self.holdings_report['totals'] = totals
 
     def _which_tax_year(self, timestamp):
-        tax_year = which_tax_year(timestamp)
+        tax_year = self.calendar.tax_year(timestamp)
         if tax_year not in self.tax_events:
             self.tax_events[tax_year] = []
 
         return tax_year
 
+def _init_worker():
+    # Only the parent process shows a progress bar
+    sys.stderr = open(os.devnull, 'w')
+
+def _process_asset(asset):
+    tax = TaxCalculator(_parallel_assets[asset], _parallel_tax.snapshots)
+    tax.start = _parallel_tax.start
+    tax.carried = [te for te in _parallel_tax.carried if te.asset == asset]
+    if asset in _parallel_tax.holdings:
+        tax.holdings[asset] = _parallel_tax.holdings[asset]
+
+    # Tax events are kept separate for each phase, so they can be merged in order
+    tax_events = []
+    tax.pool_same_day()
+    for phase in TaxCalculator.PARALLEL_PHASES:
+        if phase == TaxCalculator.DISPOSAL_SECTION_104:
+            tax.process_section104()
+        else:
+            tax.match(phase)
+
+        tax_events.append(tax.tax_events)
+        tax.tax_events = {}
+
+    recorded = tax.snapshots.get_recorded(asset) if tax.snapshots else None
+    return asset, (tax_events, tax.holdings, recorded)
+
 class TaxEvent(object):
+    __slots__ = ('date', 'asset')
+
     def __init__(self, date, asset):
         self.date = date
         self.asset = asset
@@ -409,6 +654,9 @@ class TaxEvent(object):
         return self.date < other.date
 
 class TaxEventCapitalGains(TaxEvent):
+    __slots__ = ('disposal_type', 'quantity', 'cost', 'fees', 'proceeds', 'gain',
+                 'acquisition_date')
+
     def __init__(self, disposal_type, b, s, cost, fees):
         super(TaxEventCapitalGains, self).__init__(s.timestamp, s.asset)
         self.disposal_type = disposal_type
@@ -434,6 +682,8 @@ class TaxEventCapitalGains(TaxEvent):
             config.sym() + '{:0,.2f}'.format(self.fees))
 
 class TaxEventIncome(TaxEvent):
+    __slots__ = ('type', 'quantity', 'amount', 'note', 'fees')
+
     def __init__(self, b):
         super(TaxEventIncome, self).__init__(b.timestamp, b.asset)
         self.type = b.t_type
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+import bisect
+from datetime import datetime
+
+from .config import config
+
+class TaxCalendar(object):
+    # Start of tax year boundaries are precomputed for this range of years, timestamps outside
+    #  of it are calculated directly
+    MIN_YEAR = 1970
+    MAX_YEAR = 2100
+
+    def __init__(self, start_day, start_month, first_year, tz):
+        self.start_day = start_day
+        self.start_month = start_month
+        self.first_year = first_year or 0
+        self.tz = tz
+
+        # POSIX time of each boundary, the boundary in year N is the start of tax year N+1
+        self.starts = [self.start_of_year(year).timestamp()
+                       for year in range(self.MIN_YEAR, self.MAX_YEAR + 1)]
+
+    def start_of_year(self, year):
+        return datetime(year, self.start_month, self.start_day, tzinfo=self.tz)
+
+    def tax_year(self, timestamp):
+        if timestamp.tzinfo is self.tz:
+            # Boundaries are at local midnight, so the local date alone decides the tax year
+            if (timestamp.month, timestamp.day) >= (self.start_month, self.start_day):
+                tax_year = timestamp.year + 1
+            else:
+                tax_year = timestamp.year
+            return max(tax_year, self.first_year)
+
+        i = bisect.bisect_right(self.starts, timestamp.timestamp())
+        if 0 < i < len(self.starts):
+            tax_year = self.MIN_YEAR + i
+        elif timestamp >= self.start_of_year(timestamp.year):
+            tax_year = timestamp.year + 1
+        else:
+            tax_year = timestamp.year
+
+        # Everything before the first tax year is included within it
+        return max(tax_year, self.first_year)
+
+    def boundaries(self, first, last):
+        # Start of each tax year which falls within the timestamps
+        boundaries = []
+        for year in range(max(first.year, self.first_year), last.year + 1):
+            boundary = self.start_of_year(year)
+            if first < boundary <= last:
+                boundaries.append(boundary)
+        return boundaries
+
+    @staticmethod
+    def label(tax_year):
+        return '%d/%d' % (tax_year - 1, tax_year)
+
+_tax_calendar = None
+
+def get_tax_calendar():
+    # The tax year start can be changed by the command line after the config is loaded, so the
+    #  calendar is rebuilt if it no longer matches
+    global _tax_calendar
+
+    key = (config.tax_year_start_day, config.tax_year_start_month,
+           config.tax_year_first_year or 0, config.TZ_LOCAL)
+    if _tax_calendar is None or key != (_tax_calendar.start_day, _tax_calendar.start_month,
+                                        _tax_calendar.first_year, _tax_calendar.tz):
+        _tax_calendar = TaxCalendar(*key)
+
+    return _tax_calendar
@@ -138,33 +138,52 @@ class TransactionHistory(object):
                                                                      tr.fee.timestamp,
                                                                      tr.fee.quantity)
     def which_asset_value(self, tr):
-        if config.trade_asset_type == config.TRADE_ASSET_TYPE_BUY:
-            value, fixed = self.value_asset.get_value(tr.buy.asset,
-                                                      tr.buy.timestamp,
-                                                      tr.buy.quantity)
-        elif config.trade_asset_type == config.TRADE_ASSET_TYPE_SELL:
-            value, fixed = self.value_asset.get_value(tr.sell.asset,
-                                                      tr.sell.timestamp,
-                                                      tr.sell.quantity)
-        else:
-            pos_sell_asset = pos_buy_asset = len(config.asset_priority) + 1
-
-            if tr.sell.asset in config.asset_priority:
-                pos_sell_asset = config.asset_priority.index(tr.sell.asset)
-            if tr.buy.asset in config.asset_priority:
-                pos_buy_asset = config.asset_priority.index(tr.buy.asset)
+        t = self.which_asset(tr)
+        return self.value_asset.get_value(t.asset, t.timestamp, t.quantity)
 
-            if pos_sell_asset <= pos_buy_asset:
-                value, fixed = self.value_asset.get_value(tr.sell.asset,
-                                                          tr.sell.timestamp,
-                                                          tr.sell.quantity)
-            else:
-                value, fixed = self.value_asset.get_value(tr.buy.asset,
-                                                          tr.buy.timestamp,
-                                                          tr.buy.quantity)
-        return value, fixed
+    @staticmethod
+    def which_asset(tr):
+        # The side of a trade which is used to value it
+        if config.trade_asset_type == config.TRADE_ASSET_TYPE_BUY:
+            return tr.buy
+        if config.trade_asset_type == config.TRADE_ASSET_TYPE_SELL:
+            return tr.sell
+
+        pos_sell_asset = pos_buy_asset = len(config.asset_priority) + 1
+
+        if tr.sell.asset in config.asset_priority:
+            pos_sell_asset = config.asset_priority.index(tr.sell.asset)
+        if tr.buy.asset in config.asset_priority:
+            pos_buy_asset = config.asset_priority.index(tr.buy.asset)
+
+        if pos_sell_asset <= pos_buy_asset:
+            return tr.sell
+        return tr.buy
+
+    @staticmethod
+    def get_required_values(transaction_records):
+        # The transactions which get_all_values() will value, so their prices can be fetched
+        #  up front
+        required = []
+        for tr in transaction_records:
+            if tr.buy and tr.buy.acquisition and tr.buy.cost is None:
+                required.append(TransactionHistory.which_asset(tr) if tr.sell else tr.buy)
+
+            if tr.sell and tr.sell.disposal and tr.sell.proceeds is None and not tr.buy:
+                required.append(tr.sell)
+
+            if tr.fee and tr.fee.disposal and tr.fee.proceeds is None:
+                # A fee in the same asset as the buy or sell is valued from its price
+                if tr.fee.asset in config.fiat_list or \
+                        not (tr.buy and tr.buy.asset == tr.fee.asset and tr.buy.quantity) and \
+                        not (tr.sell and tr.sell.asset == tr.fee.asset and tr.sell.quantity):
+                    required.append(tr.fee)
+        return required
 
 class TransactionBase(object):
+    __slots__ = ('tid', 't_record', 't_type', 'asset', 'quantity', 'fee_value', 'fee_fixed',
+                 'wallet', 'timestamp', 'note', 'matched', 'pooled')
+
     def __init__(self, t_type, asset, quantity):
         self.tid = None
         self.t_record = None
@@ -227,19 +246,9 @@ class TransactionBase(object):
     def __lt__(self, other):
         return (self.asset, self.timestamp) < (other.asset, other.timestamp)
 
-    def __deepcopy__(self, memo):
-        cls = self.__class__
-        result = cls.__new__(cls)
-        memo[id(self)] = result
-        for k, v in self.__dict__.items():
-            if k == 't_record':
-                # Keep reference to the transaction record
-                setattr(result, k, v)
-            else:
-                setattr(result, k, copy.deepcopy(v, memo))
-        return result
-
 class Buy(TransactionBase):
+    __slots__ = ('cost', 'cost_fixed', 'acquisition')
+
     TYPE_DEPOSIT = TransactionRecord.TYPE_DEPOSIT
     TYPE_MINING = TransactionRecord.TYPE_MINING
     TYPE_STAKING = TransactionRecord.TYPE_STAKING
@@ -264,7 +273,9 @@ class Buy(TransactionBase):
 
     def __iadd__(self, other):
         if not self.pooled:
-            self.pooled.append(copy.deepcopy(self))
+            # Copy of the first transaction before it's updated, the pooled list is replaced
+            #  (not appended to) as it may be shared with the original transaction
+            self.pooled = [copy.copy(self)]
 
         # Pool buys
         if self.asset != other.asset:
@@ -297,7 +308,8 @@ class Buy(TransactionBase):
         return self
 
     def split_buy(self, sell_quantity):
-        remainder = copy.deepcopy(self)
+        # Shallow copy, values are only ever replaced so the pooled transactions can be shared
+        remainder = copy.copy(self)
 
         self.cost = self.cost * (sell_quantity / self.quantity)
 
@@ -342,6 +354,8 @@ class Buy(TransactionBase):
             self._format_pooled(pooled_bold))
 
 class Sell(TransactionBase):
+    __slots__ = ('proceeds', 'proceeds_fixed', 'disposal')
+
     TYPE_WITHDRAWAL = TransactionRecord.TYPE_WITHDRAWAL
     TYPE_SPEND = TransactionRecord.TYPE_SPEND
     TYPE_GIFT_SENT = TransactionRecord.TYPE_GIFT_SENT
@@ -363,7 +377,9 @@ class Sell(TransactionBase):
 
     def __iadd__(self, other):
         if not self.pooled:
-            self.pooled.append(copy.deepcopy(self))
+            # Copy of the first transaction before it's updated, the pooled list is replaced
+            #  (not appended to) as it may be shared with the original transaction
+            self.pooled = [copy.copy(self)]
 
         # Pool sells
         if self.asset != other.asset:
@@ -396,7 +412,8 @@ class Sell(TransactionBase):
         return self
 
     def split_sell(self, buy_quantity):
-        remainder = copy.deepcopy(self)
+        # Shallow copy, values are only ever replaced so the pooled transactions can be shared
+        remainder = copy.copy(self)
 
         self.proceeds = self.proceeds * (buy_quantity / self.quantity)
 
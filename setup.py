@@ -44,13 +44,13 @@ setup(
         'Operating System :: MacOS',
         'Operating System :: Microsoft :: Windows',
         'Operating System :: POSIX',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
     ],
     keywords='bittytax cryptoasset cryptocurrency crypto tax',
+    python_requires='>=3.6',
     packages=['bittytax', 'bittytax.conv', 'bittytax.conv.parsers', 'bittytax.price'],
     package_data={'bittytax': ['templates/*.html']},
     install_requires=[
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+# Benchmark for the ingestion of downloaded price series. Synthetic CoinGecko market_chart
+#  (all history) and CryptoCompare histoday (OHLC) responses are parsed and stored into an empty
+#  cache, in a temporary directory, as each data source does after a request. No requests are
+#  made.
+#
+#  usage: python tools/bench_ingest.py [--days N] [--repeat N]
+
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bittytax.config import config
+from bittytax.price.datasource import DataSourceBase, CoinGecko, CryptoCompare
+from bittytax.price.pricecache import PriceSeries, OHLC
+
+DAYS = 5000
+REPEAT = 20
+
+def random_price(rnd):
+    return rnd.random() * 10 ** rnd.randint(-6, 4)
+
+def market_chart(days, rnd):
+    # Millisecond epoch times, and today's latest price at the end
+    today = int(time.time()) // 86400 * 86400
+    return {'prices': [[(today - (days - i) * 86400) * 1000, random_price(rnd)]
+                       for i in range(days)] + [[int(time.time() * 1000), random_price(rnd)]]}
+
+def histoday(days, rnd):
+    # The first days have no prices, so are returned as 0
+    today = int(time.time()) // 86400 * 86400
+    return {'Data': [{'time': today - (days - i) * 86400,
+                      'open': 0 if i < days // 20 else random_price(rnd),
+                      'high': 0 if i < days // 20 else random_price(rnd),
+                      'low': 0 if i < days // 20 else random_price(rnd),
+                      'close': 0 if i < days // 20 else random_price(rnd)}
+                     for i in range(days)]}
+
+def data_source(cls, json_resp):
+    # Set up without its coin list, the response is returned for every request
+    ds = cls.__new__(cls)
+    DataSourceBase.__init__(ds)
+    ds.assets = {'ETH': {'id': 'ethereum', 'name': 'Ethereum'}}
+    ds.get_json = lambda url: json_resp
+    return ds
+
+def bench_encode(json_resp, repeat):
+    days = [p[0] // 86400000 for p in json_resp['prices']]
+    values = [p[1] for p in json_resp['prices']]
+
+    start_time = time.time()
+    for _ in range(repeat):
+        PriceSeries.from_floats(days, values, 'url')
+    return len(days) * repeat, time.time() - start_time
+
+def bench_encode_ohlc(json_resp, repeat):
+    days = [d['time'] // 86400 for d in json_resp['Data']]
+    values = [[d.get(field) for field in OHLC] for d in json_resp['Data']]
+
+    start_time = time.time()
+    for _ in range(repeat):
+        PriceSeries.from_floats(days, values, 'url', OHLC)
+    return len(days) * repeat, time.time() - start_time
+
+def bench_store(cls, json_resp, repeat):
+    ds = data_source(cls, json_resp)
+    points = len(list(json_resp.values())[0])
+    timestamp = datetime(2019, 1, 1, tzinfo=config.TZ_UTC)
+
+    start_time = time.time()
+    for i in range(repeat):
+        # A different quote each time, so each is stored as a new pair
+        ds.get_historical('ETH', 'Q%d' % i, timestamp)
+    return points * repeat, time.time() - start_time
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=DAYS)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    args = parser.parse_args()
+
+    config.args = argparse.Namespace(debug=False, nocache=False)
+    config.CACHE_DIR = tempfile.mkdtemp()
+    rnd = random.Random(1)
+    chart = market_chart(args.days, rnd)
+    ohlc = histoday(args.days, rnd)
+
+    print("%-36s %10s %8s %12s" % ('', 'points', 'seconds', 'points/s'))
+    try:
+        for name, bench in (
+                ('encode prices', lambda: bench_encode(chart, args.repeat)),
+                ('encode OHLC', lambda: bench_encode_ohlc(ohlc, args.repeat)),
+                ('CoinGecko market_chart (stored)',
+                 lambda: bench_store(CoinGecko, chart, args.repeat)),
+                ('CryptoCompare histoday (stored)',
+                 lambda: bench_store(CryptoCompare, ohlc, args.repeat))):
+            points, elapsed = bench()
+            print("%-36s %10s %8.2f %12s" % (name,
+                                             '{:,}'.format(points),
+                                             elapsed,
+                                             '{:,.0f}'.format(points / elapsed)))
+    finally:
+        shutil.rmtree(config.CACHE_DIR)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+# Benchmark for the "same day" and "bed and breakfast" matching rules. Synthetic trade
+#  histories of increasing size are matched, the time for each transaction should stay roughly
+#  the same as the history grows (near-linear scaling).
+#
+#  usage: python tools/bench_matching.py [--assets N] [--business] [SIZE ...]
+
+import os
+import sys
+import random
+import time
+import argparse
+from decimal import Decimal
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bittytax.config import config
+from bittytax.record import TransactionRecord
+from bittytax.transactions import Buy, Sell, TransactionHistory
+from bittytax.tax import TaxCalculator
+
+SIZES = [25000, 50000, 100000, 200000]
+
+def generate(size, assets, seed=1):
+    # Buys and sells of each asset for GBP, several a day, so many disposals are matched by
+    #  both rules
+    rnd = random.Random(seed)
+    timestamp = datetime(2017, 1, 1, tzinfo=config.TZ_UTC)
+    records = []
+    for _ in range(size):
+        timestamp += timedelta(seconds=rnd.randint(1, 600))
+        asset = rnd.choice(assets)
+        quantity = Decimal(rnd.randint(1, 500000)) / 10000
+        value = Decimal(rnd.randint(100, 5000000)) / 100
+        if rnd.random() < 0.5:
+            records.append(TransactionRecord('Trade', Buy('Trade', quantity, asset, value),
+                                             Sell('Trade', value, config.CCY, value),
+                                             None, 'Wallet', timestamp, None))
+        else:
+            records.append(TransactionRecord('Trade', Buy('Trade', value, config.CCY, value),
+                                             Sell('Trade', quantity, asset, value),
+                                             None, 'Wallet', timestamp, None))
+    return records
+
+def bench(size, assets):
+    records = generate(size, assets)
+    transactions = TransactionHistory(records, None).transactions
+
+    start_time = time.time()
+    tax = TaxCalculator(transactions)
+    tax.pool_same_day()
+    pooled = len(tax.buys_ordered) + len(tax.sells_ordered)
+    tax.match(TaxCalculator.DISPOSAL_SAME_DAY)
+    tax.match(TaxCalculator.DISPOSAL_BED_AND_BREAKFAST)
+    elapsed = time.time() - start_time
+
+    matched = sum(len(tax_events) for tax_events in tax.tax_events.values())
+    return pooled, matched, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sizes', type=int, nargs='*', default=SIZES)
+    parser.add_argument('--assets', type=int, default=300)
+    parser.add_argument('--business', action='store_true')
+    args = parser.parse_args()
+
+    config.args = argparse.Namespace(debug=False, ignore_wallet_names=False)
+    config.config['business_rules'] = args.business
+    config.config['bed_and_breakfast_days'] = config.BNB_DAYS_BUSINESS if args.business \
+                                              else config.BNB_DAYS_INDIVIDUAL
+    assets = ['A%03d' % i for i in range(args.assets)]
+
+    print("%12s %10s %10s %10s %12s %8s" % ('transactions', 'pooled', 'matched', 'seconds',
+                                           'us/trans', 'scaling'))
+    first = None
+    for size in args.sizes:
+        pooled, matched, elapsed = bench(size, assets)
+        per_transaction = elapsed / size
+        first = first or per_transaction
+        print("%12d %10d %10d %10.2f %12.1f %8.2f" % (size, pooled, matched, elapsed,
+                                                     per_transaction * 1e6,
+                                                     per_transaction / first))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+# Benchmark for the memory used by transactions, tax events and holdings. Each object is
+#  measured with its fixed __slots__ layout, and again with the same attributes held in a
+#  per-instance __dict__ (the layout before __slots__ were added), so only the cost of the
+#  layout differs, the attribute values are shared.
+#
+#  usage: python tools/bench_memory.py [COUNT]
+
+import os
+import sys
+import gc
+import argparse
+import tracemalloc
+from decimal import Decimal
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bittytax.config import config
+from bittytax.record import TransactionRecord
+from bittytax.transactions import Buy, Sell
+from bittytax.tax import TaxEventCapitalGains, TaxEventIncome
+from bittytax.holdings import Holdings
+
+COUNT = 100000
+
+DICT_LAYOUTS = {}
+
+def slot_names(obj):
+    return [name for cls in type(obj).__mro__ for name in getattr(cls, '__slots__', ())
+            if hasattr(obj, name)]
+
+def slots_layout(obj):
+    copy = object.__new__(type(obj))
+    for name in slot_names(obj):
+        object.__setattr__(copy, name, getattr(obj, name))
+    return copy
+
+def dict_layout(obj):
+    # A class for each type, so instances share their dict keys as before
+    if type(obj) not in DICT_LAYOUTS:
+        DICT_LAYOUTS[type(obj)] = type(type(obj).__name__, (object,), {})
+
+    copy = DICT_LAYOUTS[type(obj)]()
+    for name in slot_names(obj):
+        setattr(copy, name, getattr(obj, name))
+    return copy
+
+def measure(function, objs):
+    gc.collect()
+    tracemalloc.start()
+    copies = [function(obj) for obj in objs]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del copies
+    return size / float(len(objs))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('count', type=int, nargs='?', default=COUNT)
+    args = parser.parse_args()
+
+    config.args = argparse.Namespace(debug=False, ignore_wallet_names=False)
+    timestamp = datetime(2020, 1, 1, tzinfo=config.TZ_UTC)
+
+    gc.collect()
+    tracemalloc.start()
+    records = []
+    for i in range(args.count):
+        quantity = Decimal(i + 1) / 1000
+        value = Decimal(i + 1) / 10
+        records.append(TransactionRecord('Trade', Buy('Trade', quantity, 'BTC', value),
+                                         Sell('Trade', value, config.CCY, value),
+                                         None, 'Wallet', timestamp + timedelta(seconds=i),
+                                         None))
+    total, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    total /= float(args.count)
+
+    objects = [('TransactionRecord', records),
+               ('Buy', [tr.buy for tr in records]),
+               ('Sell', [tr.sell for tr in records]),
+               ('TaxEventCapitalGains', [TaxEventCapitalGains('Same Day', tr.buy, tr.sell,
+                                                              tr.sell.proceeds, Decimal(0))
+                                         for tr in records]),
+               ('TaxEventIncome', [TaxEventIncome(tr.buy) for tr in records]),
+               ('Holdings', [Holdings('BTC') for _ in records])]
+
+    print("%-22s %10s %10s" % ('bytes per object', '__dict__', '__slots__'))
+    layouts = {}
+    for name, objs in objects:
+        layouts[name] = measure(dict_layout, objs), measure(slots_layout, objs)
+        print("%-22s %10.0f %10.0f" % (name, layouts[name][0], layouts[name][1]))
+
+    before = sum(layouts[name][0] for name in ('TransactionRecord', 'Buy', 'Sell'))
+    after = sum(layouts[name][1] for name in ('TransactionRecord', 'Buy', 'Sell'))
+    print("\nbytes per transaction (record, buy and sell, including values)")
+    print("%-22s %10.0f" % ('before (__dict__)', total - after + before))
+    print("%-22s %10.0f" % ('after (__slots__)', total))
+
+if __name__ == '__main__':
+    main()
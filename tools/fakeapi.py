@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# (c) Nano Nano Ltd 2021
+
+# Local stand-in for the price data sources, for testing the request limits, retries, circuit
+#  breakers and hedging without using the real APIs. Prices are made up, but are the same for
+#  each asset, quote and day on every run.
+#
+#  The first part of the path is the host of the data source, so to use it set the "base_url"
+#  for each data source in "data_source_options" (the config to use is printed on start up).
+#
+#  usage: python tools/fakeapi.py [--port PORT] [--latency SECONDS] [--fail N] [--limit N]
+#                                 [--down HOST] [--hang HOST] [--hang-secs SECONDS]
+#
+#  Request counts for each endpoint are returned by GET /_stats.
+
+import sys
+import json
+import math
+import time
+import zlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+HOSTS = {'ExchangeRatesAPI': 'api.exchangeratesapi.io',
+         'RatesAPI': 'api.ratesapi.io',
+         'Frankfurter': 'api.frankfurter.app',
+         'CoinDesk': 'api.coindesk.com',
+         'CryptoCompare': 'min-api.cryptocompare.com',
+         'CoinGecko': 'api.coingecko.com',
+         'CoinMarketCap': 'web-api.coinmarketcap.com',
+         'CoinPaprika': 'api.coinpaprika.com'}
+
+COINS = ['BTC', 'ETH', 'LTC', 'XRP', 'ADA', 'DOGE', 'DOT', 'LINK', 'XLM', 'BCH', 'USDT', 'EOS',
+         'TRX', 'XMR', 'DASH', 'ZEC', 'NEO', 'ETC', 'BNB', 'VET']
+FIAT = {'GBP': 1.0, 'USD': 1.3, 'EUR': 1.15}
+# No prices before the day each coin was listed
+LISTED = datetime(2015, 1, 1, tzinfo=timezone.utc)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+stats = {}
+stats_lock = threading.Lock()
+args = None
+
+def price(asset, quote, day):
+    if asset in FIAT:
+        base = 1 / FIAT[asset]
+    elif asset == 'BTC':
+        base = 8000.0
+    else:
+        base = (zlib.crc32(asset.encode()) % 5000) / 10.0 + 1
+
+    if quote == 'BTC':
+        base /= 8000.0 * FIAT['USD']
+    else:
+        base *= FIAT.get(quote, 1.0)
+    return round(base * (1 + 0.2 * math.sin(day / 30.0)), 8)
+
+def day_number(timestamp):
+    return (timestamp - EPOCH).days
+
+def today():
+    return day_number(datetime.now(timezone.utc))
+
+def iso_date(day):
+    return datetime.fromordinal(EPOCH.toordinal() + day).strftime('%Y-%m-%d')
+
+def listed(asset):
+    return asset in COINS or asset in FIAT
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *log_args):
+        if args.verbose:
+            super(Handler, self).log_message(*log_args)
+
+    def send_json(self, status, obj, headers=None):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = url.path.strip('/').split('/')
+        host, path = parts[0], '/' + '/'.join(parts[1:])
+
+        if host == '_stats':
+            with stats_lock:
+                return self.send_json(200, stats)
+
+        with stats_lock:
+            stats[host + path] = stats.get(host + path, 0) + 1
+            stats['total'] = stats.get('total', 0) + 1
+            count = stats['total']
+
+        if args.down and args.down in host:
+            return self.send_json(503, {'error': 'Service Unavailable'})
+        if args.hang and args.hang in host:
+            time.sleep(args.hang_secs)
+        if args.latency:
+            time.sleep(args.latency)
+        if args.limit and count % args.limit == 0:
+            return self.send_json(429, {'error': 'Too Many Requests'}, {'Retry-After': '1'})
+        if args.fail and count % args.fail == 0:
+            return self.send_json(502, {'error': 'Bad Gateway'})
+
+        try:
+            return self.send_json(200, route(host, path, query))
+        except (KeyError, ValueError) as e:
+            return self.send_json(404, {'error': str(e)})
+
+def route(host, path, query):
+    if host == HOSTS['CryptoCompare']:
+        return cryptocompare(path, query)
+    if host == HOSTS['CoinGecko']:
+        return coingecko(path, query)
+    if host == HOSTS['CoinPaprika']:
+        return coinpaprika(path, query)
+    if host == HOSTS['CoinMarketCap']:
+        return coinmarketcap(path, query)
+    if host == HOSTS['CoinDesk']:
+        return coindesk(path, query)
+    if host in (HOSTS['ExchangeRatesAPI'], HOSTS['RatesAPI'], HOSTS['Frankfurter']):
+        return fiat(host, path, query)
+    raise KeyError(host + path)
+
+def cryptocompare(path, query):
+    if path == '/data/all/coinlist':
+        return {'Data': {c: {'Symbol': c, 'CoinName': 'Coin ' + c} for c in COINS}}
+    if path == '/data/price':
+        return {t: price(query['fsym'], t, today()) for t in query['tsyms'].split(',')}
+    if path == '/data/pricemulti':
+        return {f: {t: price(f, t, today()) for t in query['tsyms'].split(',')}
+                for f in query['fsyms'].split(',') if listed(f)}
+    if path == '/data/histoday':
+        fsym, tsym = query['fsym'], query['tsym']
+        end = min(int(query['toTs']) // 86400, today())
+        # Missing prices are returned as 0
+        return {'Data': [{'time': d * 86400,
+                          'open': price(fsym, tsym, d - 0.5),
+                          'high': price(fsym, tsym, d) * 1.05,
+                          'low': price(fsym, tsym, d) * 0.95,
+                          'close': price(fsym, tsym, d)}
+                         if d >= day_number(LISTED) and listed(fsym) else
+                         {'time': d * 86400, 'open': 0, 'high': 0, 'low': 0, 'close': 0}
+                         for d in range(end - int(query['limit']), end + 1)]}
+    raise KeyError(path)
+
+def coingecko(path, query):
+    if path == '/api/v3/coins/list':
+        return [{'id': c.lower() + '-id', 'symbol': c.lower(), 'name': 'Coin ' + c}
+                for c in COINS]
+    if path == '/api/v3/simple/price':
+        return {i: {v: price(i[:-3].upper(), v.upper(), today())
+                    for v in query['vs_currencies'].split(',')}
+                for i in query['ids'].split(',')}
+    if path.startswith('/api/v3/coins/'):
+        parts = path.split('/')
+        asset = parts[4][:-3].upper()
+        if len(parts) > 5 and parts[5] == 'market_chart':
+            quote = query['vs_currency'].upper()
+            return {'prices': [[d * 86400000, price(asset, quote, d)]
+                               for d in range(day_number(LISTED), today() + 1)]}
+        return {'market_data': {'current_price': {q.lower(): price(asset, q, today())
+                                                  for q in list(FIAT) + ['BTC']}}}
+    raise KeyError(path)
+
+def coinpaprika(path, query):
+    if path == '/v1/coins':
+        return [{'id': c.lower() + '-coin', 'symbol': c, 'name': 'Coin ' + c} for c in COINS]
+    if path.startswith('/v1/tickers/'):
+        parts = path.split('/')
+        asset = parts[3].split('-')[0].upper()
+        if len(parts) > 4 and parts[4] == 'historical':
+            start = max(day_number(datetime.strptime(query['start'], '%Y-%m-%d')
+                                   .replace(tzinfo=timezone.utc)), day_number(LISTED))
+            end = min(start + int(query['limit']), today() + 1)
+            return [{'timestamp': iso_date(d) + 'T00:00:00Z',
+                     'price': price(asset, query['quote'], d)} for d in range(start, end)]
+        return {'quotes': {q: {'price': price(asset, q, today())}
+                           for q in query['quotes'].split(',')}}
+    raise KeyError(path)
+
+def coinmarketcap(path, query):
+    if path == '/v1/cryptocurrency/map':
+        return {'data': [{'id': i + 1, 'symbol': c, 'name': 'Coin ' + c}
+                         for i, c in enumerate(COINS)]}
+    asset = COINS[int(query['id']) - 1]
+    quote = query['convert']
+    if path == '/v1/cryptocurrency/quotes/latest':
+        return {'data': {query['id']: {'quote': {quote: {'price': price(asset, quote, today())}}}}}
+    if path == '/v1/cryptocurrency/ohlcv/historical':
+        start = day_number(datetime.strptime(query['time_start'], '%Y-%m-%d')
+                           .replace(tzinfo=timezone.utc))
+        return {'data': {'quotes': [
+            {'time_open': iso_date(d) + 'T00:00:00.000Z',
+             'quote': {quote: {'open': price(asset, quote, d - 0.5),
+                               'high': price(asset, quote, d) * 1.05,
+                               'low': price(asset, quote, d) * 0.95,
+                               'close': price(asset, quote, d)}}}
+            for d in range(start, today() + 1)]}}
+    raise KeyError(path)
+
+def coindesk(path, query):
+    if path == '/v1/bpi/currentprice.json':
+        return {'bpi': {q: {'rate_float': price('BTC', q, today())} for q in FIAT}}
+    if path == '/v1/bpi/historical/close.json':
+        start = day_number(datetime.strptime(query['start'], '%Y-%m-%d')
+                           .replace(tzinfo=timezone.utc))
+        return {'bpi': {iso_date(d): price('BTC', query['currency'], d)
+                        for d in range(start, today() + 1)}}
+    raise KeyError(path)
+
+def fiat(host, path, query):
+    if host == HOSTS['Frankfurter']:
+        asset, quote = query['from'], query['to']
+    else:
+        asset, quote = query['base'], query['symbols']
+        if host == HOSTS['RatesAPI']:
+            path = path[len('/api'):]
+
+    if path == '/latest':
+        day = today()
+    else:
+        day = day_number(datetime.strptime(path[1:], '%Y-%m-%d').replace(tzinfo=timezone.utc))
+    return {'rates': {quote: price(asset, quote, day)}}
+
+def main():
+    global args
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0,
+                        help="seconds added to every response")
+    parser.add_argument('--fail', type=int, default=0,
+                        help="every Nth request fails with 502 Bad Gateway")
+    parser.add_argument('--limit', type=int, default=0,
+                        help="every Nth request fails with 429 Too Many Requests")
+    parser.add_argument('--down', help="requests to this host fail with 503")
+    parser.add_argument('--hang', help="requests to this host are slow")
+    parser.add_argument('--hang-secs', dest='hang_secs', type=float, default=30)
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), Handler)
+    server.daemon_threads = True
+
+    print("data_source_options: {")
+    for name, host in HOSTS.items():
+        print("    '%s': {'base_url': 'http://127.0.0.1:%d/%s'}," % (name, args.port, host))
+    print("    }")
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()